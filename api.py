@@ -0,0 +1,240 @@
+import hashlib
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, jsonify, request
+from sqlalchemy import func, select
+from werkzeug.exceptions import HTTPException
+
+from models import db, Artist, Venue, Show, Genre
+from queries import (venue_areas, venue_search, venue_shows, artist_shows, show_listing,
+                     ARTIST_KEYS)
+from pagination import Page, page_request, paginate
+import search
+
+#----------------------------------------------------------------------------#
+# JSON API, version 1.
+#----------------------------------------------------------------------------#
+
+# /api/v1 mirrors the venue, artist and show pages as JSON, with the same
+# keyset cursors (after/before/per_page) as the HTML listings.
+#
+# Detail resources take ?fields=a,b to return only some fields; only the
+# columns and queries those fields need are run. Their strong ETag is
+# derived from updated_at (see the Versioning section of models.py, which
+# also covers the artists' or venues' names and images in show entries)
+# plus, when shows are requested, the start of the next upcoming show,
+# which is when the past/upcoming split changes. A matching If-None-Match
+# is answered 304 from that one indexed lookup, without loading the row.
+#
+# Listings and searches hash their body instead, which still saves the
+# transfer.
+#
+# /api/v1/search?q=term ranks venues and artists together in one round
+# trip (search.search): prefix matches first, then the closest names.
+# With prefix=1 only names starting with the term match, for type-ahead.
+
+api = Blueprint('api', __name__)
+
+SHOW_FIELDS = ('upcoming_shows', 'upcoming_shows_count', 'past_shows', 'past_shows_count')
+
+# Field -> column, per detail resource, in output order.
+VENUE_COLUMNS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'address': Venue.address,
+    'city': Venue.city,
+    'state': Venue.state,
+    'phone': Venue.phone,
+    'website': Venue.website,
+    'facebook_link': Venue.facebook_link,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'image_link': Venue.image_link,
+    'updated_at': Venue.updated_at,
+}
+ARTIST_COLUMNS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'website': Artist.website,
+    'facebook_link': Artist.facebook_link,
+    'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description,
+    'image_link': Artist.image_link,
+    'updated_at': Artist.updated_at,
+}
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _row(row):
+    return dict((key, _json_value(value)) for key, value in row._mapping.items())
+
+
+def _fields(allowed):
+    # Requested fields in the resource's own order; all of them by default.
+    requested = request.args.get('fields')
+    if not requested:
+        return list(allowed)
+    names = set(name.strip() for name in requested.split(',') if name.strip())
+    unknown = names - set(allowed)
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(sorted(unknown))}. '
+                   f'Available: {", ".join(allowed)}.')
+    return [name for name in allowed if name in names]
+
+
+def _etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _respond(body, etag=None):
+    # 200 with the body, or 304 when the client already holds this version.
+    response = jsonify(body)
+    response.cache_control.no_cache = True
+    if etag is None:
+        response.add_etag()
+    else:
+        response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.cache_control.no_cache = True
+    response.set_etag(etag)
+    return response
+
+
+def _page_links(page):
+    return {'next': page.next_cursor, 'prev': page.prev_cursor}
+
+
+def _detail(kind, model, columns, owner_key, shows_of, entity_id):
+    fields = _fields(list(columns) + ['genres'] + list(SHOW_FIELDS))
+    wants_shows = any(field in SHOW_FIELDS for field in fields)
+    now = datetime.now()
+
+    version = [model.updated_at]
+    if wants_shows:
+        version.append(
+            select(func.min(Show.start_time))
+            .where(owner_key == entity_id, Show.start_time > now)
+            .scalar_subquery())
+    row = db.session.query(*version).filter(model.id == entity_id).first()
+    if row is None:
+        abort(404)
+    etag = _etag(kind, entity_id, tuple(row), tuple(fields))
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    selected = [columns[field].label(field) for field in fields if field in columns]
+    data = {}
+    if selected:
+        data.update(_row(db.session.query(*selected).filter(model.id == entity_id).one()))
+    if 'genres' in fields:
+        data['genres'] = db.session.execute(
+            select(Genre.name).select_from(model).join(model.genres)
+            .where(model.id == entity_id).order_by(Genre.name)).scalars().all()
+    if wants_shows:
+        shows = shows_of(entity_id, current_app.config['DETAIL_SHOWS_LIMIT'], now)
+        for field in SHOW_FIELDS:
+            if field in fields:
+                value = shows[field]
+                data[field] = [_row(show) for show in value] if isinstance(value, list) else value
+    return _respond(dict((field, data[field]) for field in fields), etag)
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+def venues():
+    areas, page, next_start_time = venue_areas(page_request())
+    return _respond({'data': areas, **_page_links(page)})
+
+
+@api.route('/venues/search')
+def search_venues():
+    search_term = request.args.get('q', '')
+    page = page_request()
+    count = search.counts(search_term, kinds=['venue'])['venue']
+    result = Page([], page.per_page)
+    if count:
+        result = venue_search(search.matches(Venue, search_term), page)
+    return _respond({'count': count, 'data': [_row(row) for row in result.items],
+                     **_page_links(result)})
+
+
+@api.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    return _detail('venue', Venue, VENUE_COLUMNS, Show.venue_id, venue_shows, venue_id)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+def artists():
+    page = paginate(db.session.query(Artist.id, Artist.name), ARTIST_KEYS, page_request())
+    return _respond({'data': [_row(row) for row in page.items], **_page_links(page)})
+
+
+@api.route('/artists/search')
+def search_artists():
+    search_term = request.args.get('q', '')
+    page = page_request()
+    count = search.counts(search_term, kinds=['artist'])['artist']
+    result = Page([], page.per_page)
+    if count:
+        query = db.session.query(Artist.id, Artist.name).filter(search.matches(Artist, search_term))
+        result = paginate(query, ARTIST_KEYS, page)
+    return _respond({'count': count, 'data': [_row(row) for row in result.items],
+                     **_page_links(result)})
+
+
+@api.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    return _detail('artist', Artist, ARTIST_COLUMNS, Show.artist_id, artist_shows, artist_id)
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+@api.route('/search')
+def search_all():
+    search_term = request.args.get('q', '')
+    kinds = [kind.strip() for kind in request.args.get('types', 'venue,artist').split(',') if kind.strip()]
+    unknown = set(kinds) - set(search.SEARCHABLE)
+    if unknown or not kinds:
+        abort(400, f'Unknown types: {", ".join(sorted(unknown))}. '
+                   f'Available: {", ".join(search.SEARCHABLE)}.')
+    prefix = request.args.get('prefix', '') in ('1', 'true')
+    results = search.search(search_term, kinds, limit=page_request().per_page, prefix=prefix)
+    return _respond(dict((kind, {'count': result['count'],
+                                 'data': [{'id': row.id, 'name': row.name} for row in result['data']]})
+                         for kind, result in results.items()))
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+def shows():
+    page = show_listing(page_request())
+    return _respond({'data': [_row(row) for row in page.items], **_page_links(page)})
+
+
+# The app's HTML handlers for 404 and 500 are registered by code, which
+# wins over a class handler, so those codes are named here too.
+@api.errorhandler(404)
+@api.errorhandler(500)
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return jsonify({'error': error.description}), error.code
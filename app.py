@@ -3,60 +3,95 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from datetime import datetime
+from flask import (Blueprint, Flask, abort, current_app, jsonify, render_template,
+                   request, Response, flash, redirect, url_for)
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
-from logging import Formatter, FileHandler
+from logging import FileHandler, StreamHandler
+from flask.logging import default_handler
 from flask_wtf import Form
 from forms import *
 import os
 import sys
-from models import db, Artist, Venue, Show
+from models import db, Artist, Venue, Show, Genre
+from queries import (venue_areas, venue_search, venue_shows, artist_shows, show_listing,
+                     VENUE_DETAIL, ARTIST_LIST, ARTIST_DETAIL, ARTIST_KEYS)
+from pagination import Page, page_request, paginate
+import search
+from formatting import format_datetime
+from page_cache import cache
+import db_pool
+import profiling
+import metrics
+import cli
+import scheduling
+import jobs
+import images
+import assets
+from api import api
 
 from flask_migrate import Migrate
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+moment = Moment()
+migrate = Migrate()
 
-# Make Migrations
 
-migrate = Migrate(app, db)
+def create_app(config='config'):
+    # Builds the app around the single models.db. Nothing here touches the
+    # database: Flask-SQLAlchemy creates the engine on first use, so
+    # importing the app, booting workers and running `flask db` commands do
+    # not need the database to be up.
+    app = Flask(__name__)
+    # config.py holds every setting's default; `config` overrides some.
+    app.config.from_object('config')
+    if config != 'config':
+        app.config.from_object(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', db_pool.engine_options(app.config))
 
+    db.init_app(app)
+    moment.init_app(app)
 
-print(db.engine.table_names())
+    # Make Migrations
+    migrate.init_app(app, db)
 
+    # Rendered venue/artist pages, invalidated when their data is committed
+    cache.init_app(app)
+    # Post-commit work off the request path
+    jobs.init_app(app)
+    # Thumbnails of the image links
+    images.init_app(app)
+    # Fingerprinted static files, when built
+    assets.init_app(app)
 
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+    app.jinja_env.filters['datetime'] = format_datetime
 
-#----------------------------------------------------------------------------#
-# Filters.
-#----------------------------------------------------------------------------#
+    # Query count, DB time and N+1 shapes per request
+    profiling.init_app(app)
+    # Latency histograms and cache hits for /metrics
+    metrics.init_app(app)
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    app.register_blueprint(main)
+    app.register_blueprint(api, url_prefix='/api/v1')
+    app.register_blueprint(images.images, url_prefix='/images')
+    app.register_blueprint(assets.assets, url_prefix='/assets')
+    app.cli.add_command(cli.fyyur)
+    configure_logging(app)
 
+    return app
 
-app.jinja_env.filters['datetime'] = format_datetime
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+main = Blueprint('main', __name__)
 
-@app.route('/')
+
+@main.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -64,130 +99,79 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@cache.cached('{query}', group='venues')
 def venues():
-    # TODO: replace with real venues data.
-    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-    data = []
+    # Areas, their venues and each venue's upcoming show count come back
+    # from one grouped query, one page at a time.
+    data, page, next_start_time = venue_areas(page_request())
+    # The counts change when the next of these shows starts
+    cache.expire_at(next_start_time)
 
-    results = Venue.query.distinct(Venue.city, Venue.state).all()
+    return render_template('pages/venues.html', areas=data, page=page)
 
-    for result in results:
-        location = {
-            "city": result.city,
-            "state": result.state
-        }
 
-        venues = Venue.query.filter_by(
-            city=result.city, state=result.state).all()
-        venue_data = []
-
-        for venue in venues:
-            venue_data.append(
-                {
-                    "id": venue.id,
-                    "name": venue.name,
-                    'num_upcoming_shows': len(db.session.query(Show).filter(Show.start_time > datetime.now()).all())
-
-                }
-            )
-
-            location["venues"] = venue_data
-
-            data.append(location)
-
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-    search_term = request.form.get('search_term', '')
-    db_response = db.session.query(Venue).filter(
-        Venue.name.ilike(f'%{search_term}%')
-        ).all()
-
+    # GET carries the search term and cursors of the pagination links.
+    search_term = request.values.get('search_term', '')
+    page = page_request()
+    venue_filter = search.matches(Venue, search_term)
 
-   
-    # Searh Artist in the venue page
-    artist_response = db.session.query(Artist).filter(
-        Artist.name.ilike(f'%{search_term}%')
-        ).all()
-    artist_count = len(artist_response)
+    # Venue and artist match counts come back in one round trip.
+    totals = search.counts(search_term)
+    rep_count = totals['venue']
+    venue_page = Page([], page.per_page)
+    if rep_count > 0:
+        # Upcoming counts come from the show counters, not the shows.
+        venue_page = venue_search(venue_filter, page)
 
     data = []
-
-    rep_count = len(db_response)
-
-    for venue in db_response:
+    for venue in venue_page:
         data.append({
             "id": venue.id,
             "name": venue.name,
-            "num_upcoming_shows": len(list(filter(lambda x: x.start_time > datetime.now(), venue.shows)))
+            "num_upcoming_shows": venue.num_upcoming_shows
         })
 
-
-    #if search result is found in artist table redirect to artist page
-    if artist_count>0 and rep_count==0:
-
-        response = {
-        "count": artist_count,
-        "data": artist_response
-    }
-        return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    # Searh Artist in the venue page, only when no venue matched
+    if rep_count == 0:
+        artist_filter = search.matches(Artist, search_term)
+        artist_count = totals['artist']
+
+        #if search result is found in artist table redirect to artist page
+        if artist_count > 0:
+            artist_page = paginate(
+                db.session.query(Artist).options(*ARTIST_LIST).filter(artist_filter),
+                ARTIST_KEYS, page)
+            response = {
+                "count": artist_count,
+                "data": artist_page.items
+            }
+            return render_template('pages/search_artists.html', results=response, search_term=search_term, page=artist_page)
 
     #if venue found return search venue page
-    else:
-         response = {
+    response = {
         "count": rep_count,
         "data": data
     }
-         return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-
+    return render_template('pages/search_venues.html', results=response, search_term=search_term, page=venue_page)
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    # TODO: replace with real venue data from the venues table, using venue_id
-
-    # Returns object by primary key, or None
-    venue = Venue.query.get(venue_id)
-    print(venue)
-
-    # convert genre string back to array
-    setattr(venue, "genres", venue.genres.split(","))
-
-    # Get a list of shows, and count the ones in the past and future
-    past_shows = []
-    upcoming_shows = []
-    now = datetime.now()
-    for show in venue.shows:
-        if show.start_time > now:
-
-            upcoming_shows.append({
-                "artist_id": show.artist_id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": format_datetime(str(show.start_time))
-            })
-
-        else:
-            past_shows.append({
-                "artist_id": show.artist_id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": format_datetime(str(show.start_time))
-            })
+    venue = Venue.query.options(*VENUE_DETAIL).get_or_404(venue_id)
 
     data = {
-        "id": venue_id,
-        "name": "",
-        "genres": venue.genres,
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.name for genre in venue.genres],
         "address": venue.address,
         "city": venue.city,
         "state": venue.state,
@@ -197,11 +181,12 @@ def show_venue(venue_id):
         "seeking_talent": venue.seeking_talent,
         "seeking_description": venue.seeking_description,
         "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows": upcoming_shows,
-        "upcoming_shows_count": len(upcoming_shows)
+        "image_digest": venue.image_digest,
     }
+    # Past and upcoming shows arrive split, sorted, limited and counted.
+    data.update(venue_shows(venue_id, current_app.config['DETAIL_SHOWS_LIMIT']))
+    if data['upcoming_shows']:
+        cache.expire_at(data['upcoming_shows'][0].start_time)
 
     return render_template('pages/show_venue.html', venue=data)
 
@@ -209,13 +194,13 @@ def show_venue(venue_id):
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
@@ -230,7 +215,7 @@ def create_venue_submission():
                 state=form.state.data,
                 address=form.address.data,
                 phone=form.phone.data,
-                genres=",".join(form.genres.data),
+                genres=Genre.from_names(form.genres.data),
                 facebook_link=form.facebook_link.data,
                 image_link=form.image_link.data,
                 seeking_talent=form.seeking_talent.data,
@@ -252,10 +237,10 @@ def create_venue_submission():
         print("\n\n", form.errors)
         flash('An error occurred. Venue could not be listed.')
 
-    return redirect(url_for("index"))
+    return redirect(url_for('.index'))
 
 
-@app.route('/delete/<venue_id>', methods=['POST'])
+@main.route('/delete/<venue_id>', methods=['POST'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -279,7 +264,7 @@ def delete_venue(venue_id):
     # clicking that button delete it from the db then redirect the user to the homepage
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     # TODO: populate form with values from venue with ID <venue_id>
     form = VenueForm()
@@ -287,7 +272,7 @@ def edit_venue(venue_id):
 
     form = VenueForm(
         name=venue.name,
-        genres=venue.genres,
+        genres=[genre.name for genre in venue.genres],
         address=venue.address,
         city=venue.city,
         state=venue.state,
@@ -301,7 +286,7 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
@@ -315,7 +300,7 @@ def edit_venue_submission(venue_id):
             venue.state = form.state.data
             venue.address = form.address.data
             venue.phone = form.phone.data
-            venue.genres = ",".join(form.genres.data)
+            venue.genres = Genre.from_names(form.genres.data)
             venue.facebook_link = form.facebook_link.data
             venue.image_link = form.image_link.data
             venue.seeking_talent = form.seeking_talent.data
@@ -335,77 +320,48 @@ def edit_venue_submission(venue_id):
         print("\n\n", form.errors)
         flash("Venue not edited successfully.")
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
 def artists():
-    # TODO: replace with real data returned from querying the database
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
+    page = paginate(Artist.query.options(*ARTIST_LIST), ARTIST_KEYS, page_request())
+    return render_template('pages/artists.html', artists=page.items, page=page)
 
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
 
-    search_term = request.form.get('search_term', '')
-    db_response = db.session.query(Artist).filter(
-        Artist.name.ilike(f'%{search_term}%')
-        ).all()
-    art_count = len(db_response)
+    search_term = request.values.get('search_term', '')
+    artist_filter = search.matches(Artist, search_term)
+
+    art_count = search.counts(search_term, kinds=['artist'])['artist']
+    page = paginate(
+        db.session.query(Artist).options(*ARTIST_LIST).filter(artist_filter),
+        ARTIST_KEYS, page_request())
 
     response = {
         "count": art_count,
-        "data": db_response
+        "data": page.items
     }
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_artists.html', results=response, search_term=search_term, page=page)
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    # TODO: replace with real artist data from the artist table, using artist_id
-
-    # Returns object by primary key, or None
-    artist = Artist.query.get(artist_id)
-    setattr(artist, "genres", artist.genres.split(","))
-
-    # Get past and present shows
-    p_shows = list(filter(lambda show: show.start_time <
-                   datetime.now(), artist.shows))
-    u_shows = list(filter(lambda show: show.start_time >
-                   datetime.now(), artist.shows))
-                   
-
-    # Get a list of shows, and count the ones in the past and future
-    past_shows = []
-    upcoming_shows = []
-    for show in u_shows:
-
-        upcoming_shows.append({
-            "venue_name": show.venues.name,
-            "venue_id": show.venues.id,
-            "venue_image_link": show.venues.image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
-
-    for show in p_shows:
-        past_shows.append({
-            "venue_name": show.venues.name,
-            "venue_id": show.venues.id,
-            "venue_image_link": show.venues.image_link,
-            "start_time": format_datetime(str(show.start_time))
-        })
+    artist = Artist.query.options(*ARTIST_DETAIL).get_or_404(artist_id)
 
     data = {
         "id": artist.id,
         "name": artist.name,
-        "genres": artist.genres,
+        "genres": [genre.name for genre in artist.genres],
         "city": artist.city,
         "state": artist.state,
         "phone": artist.phone,
@@ -414,11 +370,12 @@ def show_artist(artist_id):
         "seeking_venue": artist.seeking_venue,
         "seeking_description": artist.seeking_description,
         "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(p_shows),
-        "upcoming_shows_count": len(u_shows),
+        "image_digest": artist.image_digest,
     }
+    # Past and upcoming shows arrive split, sorted, limited and counted.
+    data.update(artist_shows(artist_id, current_app.config['DETAIL_SHOWS_LIMIT']))
+    if data['upcoming_shows']:
+        cache.expire_at(data['upcoming_shows'][0].start_time)
 
     return render_template('pages/show_artist.html', artist=data)
 
@@ -426,7 +383,7 @@ def show_artist(artist_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
 
     # TODO: populate form with fields from artist with ID <artist_id>
@@ -434,7 +391,7 @@ def edit_artist(artist_id):
     artist = Artist.query.get(artist_id)
     form = ArtistForm(
         name=artist.name,
-        genres=artist.genres,
+        genres=[genre.name for genre in artist.genres],
         city=artist.city,
         state=artist.state,
         phone=artist.phone,
@@ -447,7 +404,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
@@ -460,7 +417,7 @@ def edit_artist_submission(artist_id):
             artist.city = form.city.data
             artist.state = form.state.data
             artist.phone = form.phone.data
-            artist.genres = ",".join(form.genres.data)
+            artist.genres = Genre.from_names(form.genres.data)
             artist.facebook_link = form.facebook_link.data
             artist.image_link = form.image_link.data
             artist.seeking_venue = form.seeking_venue.data
@@ -479,20 +436,20 @@ def edit_artist_submission(artist_id):
         print("\n\n", form.errors)
         flash("Artist  not edited successfully.")
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
@@ -509,7 +466,7 @@ def create_artist_submission():
                 city=form.city.data,
                 state=form.state.data,
                 phone=form.phone.data,
-                genres=",".join(form.genres.data), # convert array to string separated by commas
+                genres=Genre.from_names(form.genres.data),
                 image_link=form.image_link.data,
                 facebook_link=form.facebook_link.data,
                 website=form.website.data,
@@ -533,52 +490,44 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
 def shows():
     # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    shows = Show.query.all()
-    print(shows)
-    data = []
+    # Rows carry venue_id, venue_name, artist_id, artist_name,
+    # artist_image_link, artist_image_digest and start_time straight from
+    # one join.
+    page = show_listing(page_request())
 
-    # Loop through shows and add data to the array
+    return render_template('pages/shows.html', shows=page.items, page=page)
 
 
-    for i in shows:
-        data.append({
-            "venue_id": i.venue_id,
-            "venue_name": i.venue.name,
-            "artist_id": i.artist_id,
-            "artist_name": i.artist.name,
-            "artist_image_link": i.artist.image_link,
-            "start_time": str(i.start_time)
-        })
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
     form = ShowForm(request.form)
 
-    if(form.validate):
+    if form.validate():
+        # Same checks as the batch endpoint, so unknown artist/venue ids
+        # are reported instead of failing at commit.
         try:
-            show = Show(
-                artist_id=form.artist_id.data,
-                venue_id=form.venue_id.data,
-                start_time=form.start_time.data
-            )
-            db.session.add(show)
-            db.session.commit()
-            flash('Show was successfully listed!')
+            results, created = scheduling.schedule([{
+                'artist_id': form.artist_id.data,
+                'venue_id': form.venue_id.data,
+                'start_time': form.start_time.data.isoformat(),
+            }])
+            if created:
+                flash('Show was successfully listed!')
+            else:
+                for field, messages in results[0]['errors'].items():
+                    flash(f'Show was not successfully listed. {field}: {" ".join(messages)}')
         except Exception:
             db.session.rollback()
             print(sys.exc_info())
@@ -589,34 +538,83 @@ def create_show_submission():
     else:
         flash('Show was not successfully listed.')
 
-    # on successful db insert, flash success
-    
-    # TODO: on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Show could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+@main.route('/shows/batch', methods=['POST'])
+def create_shows_batch():
+    # Schedules many shows in one transaction; see scheduling.py.
+    # Body: {"shows": [{"artist_id", "venue_id", "start_time"}, ...],
+    #        "partial": false}
+    payload = request.get_json(silent=True)
+    if isinstance(payload, list):
+        payload = {'shows': payload}
+    if not isinstance(payload, dict) or not isinstance(payload.get('shows'), list):
+        return jsonify({'error': 'Expected a JSON list of shows or {"shows": [...]}.'}), 400
+
+    items = payload['shows']
+    if not items:
+        return jsonify({'error': 'The batch has no shows.'}), 400
+    limit = current_app.config['SHOW_BATCH_MAX']
+    if len(items) > limit:
+        return jsonify({'error': f'At most {limit} shows per batch.'}), 413
+
+    results, created = scheduling.schedule(items, partial=bool(payload.get('partial')))
+    if created == len(items):
+        status = 201
+    elif created:
+        status = 200
+    else:
+        status = 422
+    return jsonify({'created': created, 'results': results}), status
+
+
+#  Internal
+#  ----------------------------------------------------------------
+
+@main.route('/_internal/pool')
+def pool_stats():
+    if request.remote_addr not in current_app.config['INTERNAL_ALLOWED_IPS']:
+        abort(404)
+    return jsonify(db_pool.stats())
+
+
+@main.route('/metrics')
+def prometheus_metrics():
+    if request.remote_addr not in current_app.config['INTERNAL_ALLOWED_IPS']:
+        abort(404)
+    totals = metrics.collect(current_app.config.get('METRICS_DIR'))
+    return Response(metrics.render(totals), mimetype='text/plain; version=0.0.4')
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
+def configure_logging(app):
+    # JSON lines: application errors plus one line per request from
+    # profiling.py. Written to LOG_FILE, or stderr when it is unset.
+    if app.config.get('LOG_FILE'):
+        handler = FileHandler(app.config['LOG_FILE'])
+    else:
+        handler = StreamHandler()
+    handler.setFormatter(profiling.JsonFormatter())
+    handler.setLevel(logging.INFO)
+    # app.logger is shared by every app of this name: replace the handler
+    # an earlier create_app() installed instead of adding another.
+    for existing in list(app.logger.handlers):
+        if isinstance(existing.formatter, profiling.JsonFormatter):
+            app.logger.removeHandler(existing)
+            existing.close()
+    app.logger.removeHandler(default_handler)
     app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    app.logger.addHandler(handler)
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -624,10 +622,10 @@ if not app.debug:
 
 # Default port:
 # if __name__ == '__main__':
-#     app.run()
+#     create_app().run()
 
 # Or specify port manually:
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
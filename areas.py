@@ -0,0 +1,50 @@
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import db, areas_materialized, area_directory, AREA_DIRECTORY_SELECT, Venue, Show
+from page_cache import cache
+import jobs
+
+#----------------------------------------------------------------------------#
+# Area directory refresh.
+#----------------------------------------------------------------------------#
+
+# models.area_directory backs /venues. As a table (SQLite) it is kept
+# current by the writes themselves; as a materialized view (Postgres) it
+# is rebuilt here: by a background job after commits that wrote venues or
+# shows (one waiting refresh at a time), after each counter rollover and
+# on a schedule:
+#
+#   flask fyyur refresh-areas
+#
+# CONCURRENTLY keeps the view readable during the refresh, at the cost of
+# diffing the new contents against the old ones. Writers invalidate the
+# /venues pages when they commit, before the refresh has run, so it
+# invalidates them again once the new contents are visible.
+
+
+@jobs.task('areas.refresh')
+def refresh():
+    # Rebuilds the directory from Venue in one transaction.
+    connection = db.session.connection()
+    if areas_materialized(connection):
+        connection.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY area_directory'))
+    else:
+        connection.execute(area_directory.delete())
+        connection.execute(text(f'INSERT INTO area_directory {AREA_DIRECTORY_SELECT}'))
+    db.session.commit()
+    cache.invalidate('group:venues')
+
+
+def stale():
+    # Called by writers that bypass the ORM, inside their transaction.
+    if areas_materialized(db.session.connection()):
+        jobs.defer('areas.refresh', dedupe=True)
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_after_writes(session, flush_context):
+    written = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, (Venue, Show)) for obj in written) and \
+            areas_materialized(session.connection()):
+        jobs.defer('areas.refresh', dedupe=True)
@@ -0,0 +1,278 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+#----------------------------------------------------------------------------#
+# Static asset build.
+#----------------------------------------------------------------------------#
+
+# `flask fyyur build-assets` copies static/ into ASSETS_DIR with a content
+# hash in every name (css/main.css -> css/main.3f2a9c1e04b7.css), after joining
+# the BUNDLES and minifying CSS and JS, and writes manifest.json, mapping
+# each original name to its hashed one. Compressible files get .gz and,
+# with the brotli package, .br copies next to them.
+#
+# Templates link files through
+#
+#   asset_url(filename, **values)   url_for('static', ...) for a built file
+#   asset_urls(bundle)              the bundle, or its parts when unbuilt
+#
+# Built files are served from /assets with a year-long immutable
+# Cache-Control (a change is a new name) and precompressed when the client
+# accepts it. Without a manifest (a checkout nobody built) both helpers
+# fall back to the plain /static files, so development needs no build
+# step; run it again after changing anything under static/.
+#
+# JS is minified with the rjsmin package when installed and otherwise only
+# joined; the libraries under js/libs ship minified already. Their source
+# map comments are pointed at the hashed maps, and dropped from bundle
+# parts, whose maps no longer match.
+
+assets = Blueprint('assets', __name__)
+
+# Bundle name -> parts, in load order, relative to the static folder.
+BUNDLES = {
+    'css/fyyur.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # Loaded in <head>, before the page renders.
+    'js/fyyur-head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Deferred, after jQuery.
+    'js/fyyur.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.eot', '.otf', '.ttf')
+
+# A year, the longest lifetime caches honour.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_PUNCTUATION = ('{', '}', ';', ',', '>')
+# Strings, comments, whitespace, punctuation and everything else.
+CSS_TOKENS = re.compile(
+    r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)|([{};,>])|([^"'/\s{};,>]+|/)''',
+    re.S)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+# //# sourceMappingURL=... and /*# sourceMappingURL=... */, on bytes.
+SOURCE_MAP_URL = re.compile(rb'(/[/*][#@][ \t]*sourceMappingURL=)([^\s*]+)')
+
+
+def init_app(app):
+    path = app.config['ASSETS_MANIFEST']
+    app.extensions['assets'] = load_manifest(path) if path else None
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['asset_urls'] = asset_urls
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+
+def minify_css(text):
+    # Drops comments and whitespace next to punctuation, leaving strings
+    # alone. Spaces around ":" stay: in selectors they are combinators.
+    out, space = [], False
+    for string, comment, whitespace, punctuation, other in CSS_TOKENS.findall(text):
+        if comment:
+            continue
+        if whitespace:
+            space = True
+            continue
+        if punctuation:
+            if punctuation == '}' and out and out[-1] == ';':
+                out.pop()
+            out.append(punctuation)
+        else:
+            if space and out and out[-1] not in CSS_PUNCTUATION:
+                out.append(' ')
+            out.append(string or other)
+        space = False
+    return ''.join(out)
+
+
+def minify_js(text):
+    try:
+        import rjsmin
+    except ImportError:
+        return text
+    return rjsmin.jsmin(text)
+
+
+def _hashed(name, content):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _rewrite_urls(name, text, manifest):
+    # url()s relative to the file at `name` now point at hashed files in the
+    # same layout; unknown targets are left alone.
+    def replace(match):
+        quote, target = match.groups()
+        path, sep, suffix = target.partition('?') if '?' in target else target.partition('#')
+        if path.startswith(('/', 'data:', 'http:', 'https:')):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        if resolved not in manifest:
+            return match.group(0)
+        relative = posixpath.relpath(manifest[resolved], posixpath.dirname(name) or '.')
+        return f'url({quote}{relative}{sep}{suffix}{quote})'
+    return CSS_URL.sub(replace, text)
+
+
+def _rewrite_source_map(name, content, manifest):
+    # Points a file's source map comment at the hashed map; like url()s,
+    # unknown targets are left alone.
+    def replace(match):
+        prefix, target = match.groups()
+        target = target.decode('utf-8', 'replace')
+        if target.startswith(('/', 'data:', 'http:', 'https:')):
+            return match.group(0)
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(name), target))
+        if resolved not in manifest:
+            return match.group(0)
+        relative = posixpath.relpath(manifest[resolved], posixpath.dirname(name) or '.')
+        return prefix + relative.encode('utf-8')
+    return SOURCE_MAP_URL.sub(replace, content)
+
+
+def _write(directory, name, content):
+    path = os.path.join(directory, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside and renamed, so a file is never served half done.
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+def _compressed(content):
+    variants = {'.gz': gzip.compress(content, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content)
+    # A variant only pays off when it is smaller.
+    return dict((ext, data) for ext, data in variants.items() if len(data) < len(content))
+
+
+def build(static_dir, output_dir, bundles=BUNDLES):
+    # Builds output_dir from static_dir and returns the manifest.
+    sources = {}
+    for root, dirs, files in os.walk(static_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                sources[name] = f.read()
+
+    outputs = {}
+    for name, content in sources.items():
+        if name not in bundles:
+            outputs[name] = content
+    for name, parts in bundles.items():
+        missing = [part for part in parts if part not in sources]
+        if missing:
+            raise FileNotFoundError(f'bundle {name} needs {", ".join(missing)}')
+        # A part's source map does not line up with the joined file.
+        contents = [SOURCE_MAP_URL.sub(b'', sources[part]) for part in parts]
+        if name.endswith('.css'):
+            # Parts share the bundle's directory, so their url()s still hold.
+            outputs[name] = b'\n'.join(contents)
+        else:
+            # A part without a final semicolon must not run into the next.
+            outputs[name] = b'\n;\n'.join(contents)
+
+    # Source maps first and CSS last: JS and CSS name the hashed maps, and
+    # CSS url()s the other hashed files.
+    manifest = {}
+    order = lambda name: (0 if name.endswith('.map') else 2 if name.endswith('.css') else 1, name)
+    for name in sorted(outputs, key=order):
+        content = outputs[name]
+        if name.endswith('.css'):
+            content = minify_css(_rewrite_urls(name, content.decode('utf-8'), manifest)).encode('utf-8')
+        elif name.endswith('.js') and not name.endswith('.min.js'):
+            content = minify_js(content.decode('utf-8')).encode('utf-8')
+        if name.endswith(('.js', '.css')):
+            content = _rewrite_source_map(name, content, manifest)
+        manifest[name] = hashed = _hashed(name, content)
+        _write(output_dir, hashed, content)
+        if name.endswith(COMPRESSIBLE):
+            for ext, data in _compressed(content).items():
+                _write(output_dir, hashed + ext, data)
+
+    _write(output_dir, 'manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+#----------------------------------------------------------------------------#
+# Links.
+#----------------------------------------------------------------------------#
+
+
+def asset_url(filename, **values):
+    # url_for('static', filename=...), for the built copy when there is one.
+    manifest = current_app.extensions.get('assets')
+    if manifest and filename in manifest:
+        return url_for('assets.asset', filename=manifest[filename], **values)
+    return url_for('static', filename=filename, **values)
+
+
+def asset_urls(bundle):
+    manifest = current_app.extensions.get('assets')
+    if manifest and bundle in manifest:
+        return [asset_url(bundle)]
+    return [url_for('static', filename=part) for part in BUNDLES[bundle]]
+
+
+@assets.route('/<path:filename>')
+def asset(filename):
+    directory = current_app.config['ASSETS_DIR']
+    if filename == 'manifest.json' or filename.endswith(('.gz', '.br')):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    compressible = filename.endswith(COMPRESSIBLE)
+    encoding = None
+    for name, ext in ENCODINGS:
+        if compressible and name in request.accept_encodings and \
+                os.path.isfile(os.path.join(directory, *(filename + ext).split('/'))):
+            encoding, filename = name, filename + ext
+            break
+    response = send_from_directory(directory, filename, mimetype=mimetype,
+                                   max_age=IMMUTABLE_MAX_AGE)
+    if encoding is not None:
+        response.content_encoding = encoding
+    if compressible:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,67 @@
+"""Per-call cost of the `datetime` Jinja filter.
+
+    python -m bench.bench_datetime [--values N] [--rounds N]
+
+Compares the previous filter (str() -> dateutil.parser.parse ->
+babel.dates.format_datetime with a pattern string) with formatting.py,
+both cold (every value new) and warm (a page re-rendering the same start
+times), and checks that both produce identical strings.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+import formatting
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def per_call(fn, values, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for value in values:
+            fn(value)
+    return (time.perf_counter() - start) / (rounds * len(values))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--values', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base = datetime(2026, 1, 1, 20, 0)
+    values = [base + timedelta(days=rng.randint(0, 365), minutes=30 * rng.randint(0, 12))
+              for _ in range(args.values)]
+
+    for format in ('full', 'medium'):
+        mismatches = sum(1 for value in values
+                         if legacy_format_datetime(str(value), format)
+                         != formatting.format_datetime(value, format))
+
+        legacy = per_call(lambda v: legacy_format_datetime(str(v), format), values, args.rounds)
+        formatting._render.cache_clear()
+        cold = per_call(lambda v: formatting.format_datetime(v, format), values, 1)
+        warm = per_call(lambda v: formatting.format_datetime(v, format), values, args.rounds)
+
+        print(f'{format:6} legacy {legacy * 1e6:8.2f} us   '
+              f'cold {cold * 1e6:7.2f} us ({legacy / cold:5.1f}x)   '
+              f'warm {warm * 1e6:6.2f} us ({legacy / warm:6.1f}x)   '
+              f'mismatches {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
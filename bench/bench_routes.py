@@ -0,0 +1,269 @@
+"""Latency, query count and memory of every route, via the test client.
+
+    python -m bench.bench_routes [--venues N] [--artists N] [--shows N]
+                                 [--requests N] [--writes] [--output FILE]
+
+Seeds an SQLite file with bench.datagen (or uses --database-url as is),
+then requests each route --requests times with ids drawn from a seeded
+generator. For each route it records latency percentiles, statements per
+request and the peak Python allocation of one request (measured in a
+separate tracemalloc pass so tracing does not skew the timings).
+
+--writes adds the POST routes, which change the data; they run after all
+reads. Results go to --output as JSON (see bench.compare to diff two runs).
+Exits non-zero when any route answered with a server error.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import create_app
+from models import db, Artist, Venue
+from pagination import PageRequest
+from queries import venue_areas
+from bench import datagen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VENUE_FORM = {
+    'name': 'Bench Venue', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+    'phone': '5551234', 'genres': ['Jazz', 'Blues'], 'facebook_link': 'https://facebook.com/x',
+    'image_link': 'https://example.com/x.jpg', 'website_link': 'https://example.com',
+    'seeking_description': '',
+}
+ARTIST_FORM = {
+    'name': 'Bench Artist', 'city': 'San Francisco', 'state': 'CA', 'phone': '5551234',
+    'genres': ['Jazz'], 'facebook_link': 'https://facebook.com/x',
+    'image_link': 'https://example.com/x.jpg', 'website_link': 'https://example.com',
+    'seeking_description': '',
+}
+
+
+def _show_form(rng, ids):
+    start = datetime.now() + timedelta(days=rng.randint(1, 365))
+    return {'venue_id': rng.randint(*ids['venue']), 'artist_id': rng.randint(*ids['artist']),
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+# label -> (method, path pattern, form data or a callable building it)
+READS = [
+    ('home', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues page 2', 'GET', '/venues?after={venue_cursor}', None),
+    ('venue', 'GET', '/venues/{venue_id}', None),
+    ('venue search', 'POST', '/venues/search', {'search_term': '{term}'}),
+    ('venue edit form', 'GET', '/venues/{venue_id}/edit', None),
+    ('venue create form', 'GET', '/venues/create', None),
+    ('artists', 'GET', '/artists', None),
+    ('artist', 'GET', '/artists/{artist_id}', None),
+    ('artist search', 'POST', '/artists/search', {'search_term': '{term}'}),
+    ('artist edit form', 'GET', '/artists/{artist_id}/edit', None),
+    ('artist create form', 'GET', '/artists/create', None),
+    ('shows', 'GET', '/shows', None),
+    ('show create form', 'GET', '/shows/create', None),
+    ('api venues', 'GET', '/api/v1/venues', None),
+    ('api venue', 'GET', '/api/v1/venues/{venue_id}', None),
+    ('api venue fields', 'GET', '/api/v1/venues/{venue_id}?fields=id,name,city,state', None),
+    ('api venue search', 'GET', '/api/v1/venues/search?q={term}', None),
+    ('api artists', 'GET', '/api/v1/artists', None),
+    ('api artist', 'GET', '/api/v1/artists/{artist_id}', None),
+    ('api artist search', 'GET', '/api/v1/artists/search?q={term}', None),
+    ('api shows', 'GET', '/api/v1/shows', None),
+    ('pool stats', 'GET', '/_internal/pool', None),
+    ('metrics', 'GET', '/metrics', None),
+]
+
+WRITES = [
+    ('venue create', 'POST', '/venues/create', lambda rng, ids: VENUE_FORM),
+    ('venue edit', 'POST', '/venues/{venue_id}/edit', lambda rng, ids: VENUE_FORM),
+    ('artist create', 'POST', '/artists/create', lambda rng, ids: ARTIST_FORM),
+    ('artist edit', 'POST', '/artists/{artist_id}/edit', lambda rng, ids: ARTIST_FORM),
+    ('show create', 'POST', '/shows/create', _show_form),
+    ('show batch', 'POST', '/shows/batch',
+     lambda rng, ids: [_show_form(rng, ids) for _ in range(20)]),
+]
+
+TERMS = ['a', 'the', 'hop', 'music', 'park sq', 'zzz']
+
+
+# Overrides applied on top of config.py.
+BENCH_SETTINGS = {
+    'SECRET_KEY': 'bench',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'DEBUG': False,
+    'WTF_CSRF_ENABLED': False,
+    'LOG_FILE': os.devnull,
+    # The generated image links are not real images.
+    'IMAGE_THUMBNAILS': False,
+}
+
+
+def make_bench_app(database_url, page_cache=False):
+    settings = dict(BENCH_SETTINGS)
+    settings['SQLALCHEMY_DATABASE_URI'] = database_url
+    settings['PAGE_CACHE_BACKEND'] = 'memory' if page_cache else None
+    return create_app(type('BenchConfig', (object,), settings))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StatementCounter(object):
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(Engine, 'before_cursor_execute', self._count)
+
+
+def _request(client, method, path, data):
+    # Lists are sent as a JSON body, dicts as a form.
+    if isinstance(data, list):
+        response = client.open(path, method=method, json=data)
+    else:
+        response = client.open(path, method=method, data=data)
+    response.close()
+    return response.status_code
+
+
+def _fill(value, params):
+    if isinstance(value, str):
+        return value.format(**params)
+    if isinstance(value, dict):
+        return dict((k, _fill(v, params)) for k, v in value.items())
+    return value
+
+
+def _params(rng, ids, cursor):
+    return {
+        'venue_id': rng.randint(*ids['venue']),
+        'artist_id': rng.randint(*ids['artist']),
+        'term': rng.choice(TERMS),
+        'venue_cursor': cursor,
+    }
+
+
+def run_route(client, counter, rng, ids, cursor, spec, requests):
+    label, method, pattern, data = spec
+    timings, statements, statuses = [], [], {}
+    for _ in range(requests):
+        params = _params(rng, ids, cursor)
+        body = data(rng, ids) if callable(data) else data
+        path, body = _fill(pattern, params), _fill(body, params)
+        before = counter.count
+        start = time.perf_counter()
+        status = _request(client, method, path, body)
+        timings.append(time.perf_counter() - start)
+        statements.append(counter.count - before)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    params = _params(rng, ids, cursor)
+    body = data(rng, ids) if callable(data) else data
+    tracemalloc.start()
+    _request(client, method, _fill(pattern, params), _fill(body, params))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'method': method,
+        'path': pattern,
+        'requests': requests,
+        'status': dict((str(k), v) for k, v in sorted(statuses.items())),
+        'latency_ms': {
+            'min': timings[0] * 1000,
+            'p50': statistics.median(timings) * 1000,
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            'max': timings[-1] * 1000,
+            'mean': statistics.fmean(timings) * 1000,
+        },
+        'queries': {'min': min(statements), 'max': max(statements),
+                    'mean': statistics.fmean(statements)},
+        'peak_alloc_kb': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help='an already seeded database')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--writes', action='store_true')
+    parser.add_argument('--page-cache', action='store_true')
+    parser.add_argument('--output', default='bench-routes.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        app = make_bench_app(database_url, args.page_cache)
+        with app.app_context():
+            if args.database_url is None:
+                db.create_all()
+                datagen.generate(args.venues, args.artists, args.shows, args.seed)
+            ids = {'venue': datagen.id_range(Venue),
+                   'artist': datagen.id_range(Artist)}
+            db.session.remove()
+
+        client = app.test_client()
+        with app.test_request_context():
+            cursor = venue_areas(PageRequest(None, None, app.config['PAGE_SIZE']))[1].next_cursor or ''
+
+        rng = random.Random(args.seed)
+        counter = StatementCounter()
+        routes = {}
+        try:
+            for spec in READS + (WRITES if args.writes else []):
+                routes[spec[0]] = result = run_route(client, counter, rng, ids, cursor, spec, args.requests)
+                print(f"{spec[0]:20} p50 {result['latency_ms']['p50']:8.2f} ms  "
+                      f"p95 {result['latency_ms']['p95']:8.2f} ms  "
+                      f"queries {result['queries']['mean']:6.1f}  "
+                      f"peak {result['peak_alloc_kb']:8.1f} KiB  status {result['status']}")
+        finally:
+            counter.close()
+
+    results = {
+        'revision': git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'database': database_url.split(':', 1)[0],
+        'dataset': None if args.database_url else {
+            'venues': args.venues, 'artists': args.artists, 'shows': args.shows, 'seed': args.seed},
+        'page_cache': args.page_cache,
+        'routes': routes,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f'results written to {args.output}')
+
+    failed = [label for label, route in routes.items()
+              if any(int(status) >= 500 for status in route['status'])]
+    if failed:
+        print('server errors: ' + ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
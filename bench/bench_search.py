@@ -0,0 +1,94 @@
+"""Compare database ILIKE search with the in-process inverted index.
+
+    python -m bench.bench_search [--venues N] [--artists N] [--queries N]
+
+Seeds an in-memory SQLite database, checks that both backends return the
+same ids for every query term and prints per-lookup timings.
+"""
+import argparse
+import random
+import string
+import time
+
+from models import db, Artist, Venue
+import search_index
+from bench.common import make_app
+
+CITIES = ['San Francisco', 'New York', 'Austin', 'Chicago', 'Seattle', 'Denver']
+WORDS = ['The', 'Musical', 'Hop', 'Park', 'Square', 'Live', 'Music', 'Coffee',
+         'Dueling', 'Pianos', 'Bar', 'Guns', 'Petals', 'Wild', 'Sax', 'Band']
+
+
+def name(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) + \
+        ' ' + ''.join(rng.choice(string.ascii_lowercase) for _ in range(4))
+
+
+def seed(rng, venues, artists):
+    db.session.bulk_insert_mappings(Venue, [dict(
+        name=name(rng), city=rng.choice(CITIES), state='CA', address='1 Main St',
+        phone=5551234, seeking_talent=False
+    ) for _ in range(venues)])
+    db.session.bulk_insert_mappings(Artist, [dict(
+        name=name(rng), city=rng.choice(CITIES), state='CA', phone=5551234,
+        seeking_venue=False
+    ) for _ in range(artists)])
+    db.session.commit()
+
+
+def terms(rng, count):
+    result = []
+    for _ in range(count):
+        word = rng.choice(WORDS).lower()
+        start = rng.randint(0, max(0, len(word) - 2))
+        result.append(word[start:start + rng.randint(1, len(word) - start)])
+    return result
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(term) for term in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed(rng, args.venues, args.artists)
+        queries = terms(rng, args.queries)
+
+        start = time.perf_counter()
+        search_index.reset()
+        search_index.get_index()
+        build = time.perf_counter() - start
+
+        for kind, model in search_index.MODELS.items():
+            def ilike(term):
+                return set(id for id, in db.session.query(model.id).filter(
+                    model.name.ilike(f'%{term}%')))
+
+            def memory(term):
+                return search_index.lookup(kind, term)
+
+            db_time, db_results = timed(ilike, queries)
+            mem_time, mem_results = timed(memory, queries)
+            mismatches = sum(1 for a, b in zip(db_results, mem_results) if a != b)
+
+            print(f'{kind:7} ilike {db_time * 1000:8.3f} ms/query   '
+                  f'index {mem_time * 1000:8.3f} ms/query   '
+                  f'speedup {db_time / mem_time:7.1f}x   mismatches {mismatches}')
+
+        print(f'index build {build:.2f}s for {args.venues} venues, {args.artists} artists')
+
+
+if __name__ == '__main__':
+    main()
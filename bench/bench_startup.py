@@ -0,0 +1,91 @@
+"""Startup cost: cold import, create_app() and the first request.
+
+    python -m bench.bench_startup [--runs N] [--database-url URL]
+
+Each run is a fresh interpreter, so module imports are really cold. The
+default database URL points at a port nothing listens on: importing the
+app and building it must not need the database, and the home page (which
+runs no queries) must still render. A second set of runs uses an SQLite
+file; its schema is created before timing starts, so the first request
+to /venues pays for opening a connection and running real queries.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+UNREACHABLE = 'postgresql://postgres@127.0.0.1:9/fyyur'
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import app as fyyur
+imported = time.perf_counter()
+
+# Overrides only: create_app loads config.py's defaults first.
+class Config(object):
+    SECRET_KEY = 'bench'
+    SQLALCHEMY_DATABASE_URI = sys.argv[1]
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    PAGE_CACHE_BACKEND = None
+
+application = fyyur.create_app(Config)
+created = time.perf_counter()
+
+if sys.argv[2] != '/':
+    with application.app_context():
+        fyyur.db.create_all()
+        fyyur.db.engine.dispose()
+client = application.test_client()
+ready = time.perf_counter()
+status = client.get(sys.argv[2]).status_code
+served = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': served - ready,
+    'status': status,
+}))
+'''
+
+
+def probe(database_url, path):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, database_url, path],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(label, runs):
+    statuses = sorted(set(run['status'] for run in runs))
+    print(f'{label}  (status {statuses})')
+    for phase in ('import', 'create_app', 'first_request'):
+        values = [run[phase] * 1000 for run in runs]
+        print(f'  {phase:14} median {statistics.median(values):8.2f} ms   '
+              f'max {max(values):8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--database-url', default=UNREACHABLE)
+    args = parser.parse_args()
+
+    report(f'{args.database_url} GET /',
+           [probe(args.database_url, '/') for _ in range(args.runs)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = 'sqlite:///' + os.path.join(tmp, 'fyyur.db')
+        report('sqlite GET /venues',
+               [probe(url, '/venues') for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+from flask import Flask
+
+from models import db
+
+
+def make_app(database_url='sqlite://'):
+    # A bare app bound to models.db, for scripts that exercise queries
+    # without the views.
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
@@ -0,0 +1,56 @@
+"""Diff two JSON results of bench.bench_routes or bench.loadgen.
+
+    python -m bench.compare BASELINE.json CANDIDATE.json [--threshold PCT]
+
+Prints p50 latency and query count per route side by side and flags
+routes whose p50 got slower by more than --threshold percent or that now
+issue more queries. Exits non-zero when anything is flagged.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0)
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline  {baseline.get('revision')}\ncandidate {candidate.get('revision')}")
+
+    flagged = 0
+    for label in sorted(set(baseline['routes']) | set(candidate['routes'])):
+        old, new = baseline['routes'].get(label), candidate['routes'].get(label)
+        if not old or not new or 'latency_ms' not in old or 'latency_ms' not in new:
+            print(f'{label:20} only in {"candidate" if new else "baseline"}')
+            continue
+
+        before, after = old['latency_ms']['p50'], new['latency_ms']['p50']
+        change = (after - before) / before * 100 if before else 0.0
+        line = f'{label:20} p50 {before:8.2f} -> {after:8.2f} ms ({change:+6.1f}%)'
+        slower = change > args.threshold
+
+        more_queries = False
+        if 'queries' in old and 'queries' in new:
+            queries_before, queries_after = old['queries']['mean'], new['queries']['mean']
+            line += f'   queries {queries_before:6.1f} -> {queries_after:6.1f}'
+            more_queries = queries_after > queries_before
+
+        if slower or more_queries:
+            flagged += 1
+            line += '   <<'
+        print(line)
+
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Seeded synthetic data for benchmarks.
+
+    python -m bench.datagen --database-url URL [--venues N] [--artists N] [--shows N]
+
+Fills an empty database (schema from db.create_all()) with venues, artists,
+genres and shows drawn from a seeded random generator, so two runs with the
+same arguments produce the same rows. Rows are written with executemany in
+chunks of --batch-size and never held in memory all at once, so millions of
+shows are fine. The show counters and the area directory are then set in
+one pass each.
+"""
+import argparse
+import random
+import string
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from models import db, Artist, Venue, Show, Genre, venue_genres, artist_genres
+import areas
+import show_counts
+from bench.common import make_app
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'),
+          ('Seattle', 'WA'), ('Denver', 'CO'), ('Nashville', 'TN'), ('Portland', 'OR')]
+WORDS = ['The', 'Musical', 'Hop', 'Park', 'Square', 'Live', 'Music', 'Coffee',
+         'Dueling', 'Pianos', 'Bar', 'Guns', 'Petals', 'Wild', 'Sax', 'Band']
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+          'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+          'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+
+# Shows are spread over this window around the time of generation, so
+# every listing has both past and upcoming shows.
+SHOW_WINDOW = timedelta(days=730)
+
+
+def name(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) + \
+        ' ' + ''.join(rng.choice(string.ascii_lowercase) for _ in range(4))
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(table, rows, batch_size):
+    for chunk in _chunks(rows, batch_size):
+        db.session.execute(table.insert(), chunk)
+
+
+def id_range(model):
+    low, high = db.session.execute(select(func.min(model.id), func.max(model.id))).one()
+    return low, high
+
+
+def _venues(rng, count):
+    for _ in range(count):
+        city, state = rng.choice(CITIES)
+        yield dict(name=name(rng), city=city, state=state, address='1 Main St',
+                   phone=5551234, image_link='https://example.com/venue.jpg',
+                   facebook_link='https://facebook.com/venue', seeking_talent=rng.random() < 0.5)
+
+
+def _artists(rng, count):
+    for _ in range(count):
+        city, state = rng.choice(CITIES)
+        yield dict(name=name(rng), city=city, state=state, phone=5551234,
+                   image_link='https://example.com/artist.jpg',
+                   facebook_link='https://facebook.com/artist', seeking_venue=False)
+
+
+def _genre_links(rng, owner, low, high, genre_ids):
+    for id in range(low, high + 1):
+        for genre_id in rng.sample(genre_ids, rng.randint(1, 3)):
+            yield {owner: id, 'genre_id': genre_id}
+
+
+def _shows(rng, count, venues, artists, now):
+    window = int(SHOW_WINDOW.total_seconds() // 1800)
+    for _ in range(count):
+        offset = timedelta(minutes=30 * rng.randint(-window // 2, window // 2))
+        yield dict(venue_id=rng.randint(*venues), artist_id=rng.randint(*artists),
+                   start_time=now + offset)
+
+
+def generate(venues, artists, shows, seed=1, batch_size=10000, now=None):
+    # Must run inside an app context, against an empty schema.
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+
+    _insert(Genre.__table__, ({'name': genre} for genre in GENRES), batch_size)
+    genre_ids = [id for id, in db.session.execute(select(Genre.id))]
+
+    _insert(Venue.__table__, _venues(rng, venues), batch_size)
+    _insert(Artist.__table__, _artists(rng, artists), batch_size)
+    venue_ids = id_range(Venue)
+    artist_ids = id_range(Artist)
+
+    _insert(venue_genres, _genre_links(rng, 'venue_id', *venue_ids, genre_ids), batch_size)
+    _insert(artist_genres, _genre_links(rng, 'artist_id', *artist_ids, genre_ids), batch_size)
+    if shows:
+        _insert(Show.__table__, _shows(rng, shows, venue_ids, artist_ids, now), batch_size)
+    db.session.commit()
+    show_counts.check(repair=True)
+    areas.refresh()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--shows', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        generate(args.venues, args.artists, args.shows, args.seed, args.batch_size)
+        print(f'{args.venues} venues, {args.artists} artists, {args.shows} shows '
+              f'in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Check that the listing and detail queries use the Show indexes.
+
+    python -m bench.explain_plans [--database-url URL]
+
+Runs the real query functions against a small seeded database, captures
+the SQL they emit and EXPLAINs it (EXPLAIN QUERY PLAN on SQLite, EXPLAIN
+with sequential scans disabled on Postgres). Exits non-zero when a query
+no longer touches the index it is expected to use.
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db, Artist, Venue, Show
+from pagination import PageRequest
+import queries
+from bench.common import make_app
+
+# label -> (callable, index the captured statements must use)
+CHECKS = [
+    ('venue directory', lambda: queries.venue_areas(PageRequest(None, None, 20)),
+     'ix_Show_venue_id_start_time'),
+    ('show listing', lambda: queries.show_listing(PageRequest(None, None, 20)),
+     'ix_Show_start_time_id'),
+    ('venue detail', lambda: queries.venue_shows(1, 10),
+     'ix_Show_venue_id_start_time'),
+    ('artist detail', lambda: queries.artist_shows(1, 10),
+     'ix_Show_artist_id_start_time'),
+]
+
+
+def seed():
+    now = datetime.now()
+    venues = [Venue(name=f'Venue {i}', city='San Francisco', state='CA', address='1 Main St',
+                    phone=5551234, seeking_talent=False) for i in range(20)]
+    artists = [Artist(name=f'Artist {i}', city='San Francisco', state='CA', phone=5551234,
+                      seeking_venue=False) for i in range(20)]
+    db.session.add_all(venues + artists)
+    db.session.flush()
+    db.session.add_all(Show(venue_id=venues[i % 20].id, artist_id=artists[i % 7].id,
+                            start_time=now + timedelta(days=i - 100)) for i in range(200))
+    db.session.commit()
+
+
+def capture(fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    db.session.expunge_all()
+    return statements
+
+
+def explain(statement, parameters):
+    connection = db.session.connection()
+    raw = connection.connection.cursor()
+    if db.engine.dialect.name == 'sqlite':
+        raw.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return '\n'.join(str(row[-1]) for row in raw.fetchall())
+    raw.execute('SET LOCAL enable_seqscan = off')
+    raw.execute('EXPLAIN ' + statement, parameters)
+    return '\n'.join(row[0] for row in raw.fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    # Heroku sets DATABASE_URL with the postgres:// scheme SQLAlchemy 1.4
+    # no longer accepts.
+    database_url = args.database_url
+    if database_url.startswith('postgres://'):
+        database_url = 'postgresql://' + database_url[len('postgres://'):]
+
+    app = make_app(database_url)
+    failures = 0
+    with app.app_context():
+        if database_url == 'sqlite://':
+            db.create_all()
+            seed()
+
+        for label, fn, index in CHECKS:
+            plans = [explain(statement, parameters) for statement, parameters in capture(fn)]
+            ok = any(index in plan for plan in plans)
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label:16} expects {index}")
+            if args.verbose or not ok:
+                for plan in plans:
+                    print('     ' + plan.replace('\n', '\n     '))
+            db.session.rollback()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
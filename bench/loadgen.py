@@ -0,0 +1,160 @@
+"""Threaded HTTP load generator for a running server.
+
+    python -m bench.loadgen http://127.0.0.1:5000 [--users N] [--duration S]
+                            [--venue-ids LOW-HIGH] [--artist-ids LOW-HIGH]
+
+Each simulated user is a thread with its own keep-alive connection that
+picks routes from a weighted mix (browsing-heavy, like real traffic) with
+an optional think time between requests, for --duration seconds. Reports
+throughput and latency percentiles per route and writes them to --output
+as JSON, in the same layout as bench.bench_routes.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from bench.bench_routes import TERMS, git_revision
+
+# label -> (weight, method, path pattern, form data)
+MIX = [
+    ('home', 5, 'GET', '/', None),
+    ('venues', 15, 'GET', '/venues', None),
+    ('venue', 20, 'GET', '/venues/{venue_id}', None),
+    ('venue search', 10, 'POST', '/venues/search', {'search_term': '{term}'}),
+    ('artists', 10, 'GET', '/artists', None),
+    ('artist', 20, 'GET', '/artists/{artist_id}', None),
+    ('artist search', 5, 'POST', '/artists/search', {'search_term': '{term}'}),
+    ('shows', 15, 'GET', '/shows', None),
+]
+
+
+def id_range(value):
+    low, high = value.split('-')
+    return int(low), int(high)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class User(threading.Thread):
+
+    def __init__(self, url, args, seed, deadline):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.args = args
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.results = dict((label, {'timings': [], 'errors': 0, 'status': {}}) for label, *_ in MIX)
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.url.netloc, timeout=30)
+
+    def run(self):
+        labels = [spec[0] for spec in MIX]
+        weights = [spec[1] for spec in MIX]
+        specs = dict((spec[0], spec) for spec in MIX)
+        connection = self._connect()
+        while time.monotonic() < self.deadline:
+            label = self.rng.choices(labels, weights)[0]
+            _, _, method, pattern, data = specs[label]
+            params = {
+                'venue_id': self.rng.randint(*self.args.venue_ids),
+                'artist_id': self.rng.randint(*self.args.artist_ids),
+                'term': self.rng.choice(TERMS),
+            }
+            path = self.url.path.rstrip('/') + pattern.format(**params)
+            body = urlencode(dict((k, v.format(**params)) for k, v in data.items())) if data else None
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+
+            result = self.results[label]
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                result['errors'] += 1
+                connection.close()
+                connection = self._connect()
+                continue
+            result['timings'].append(time.perf_counter() - start)
+            result['status'][str(response.status)] = result['status'].get(str(response.status), 0) + 1
+            if self.args.think_time:
+                time.sleep(self.rng.expovariate(1 / self.args.think_time))
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--think-time', type=float, default=0, help='mean seconds between requests')
+    parser.add_argument('--venue-ids', type=id_range, default=(1, 1000))
+    parser.add_argument('--artist-ids', type=id_range, default=(1, 5000))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench-load.json')
+    args = parser.parse_args()
+
+    deadline = time.monotonic() + args.duration
+    users = [User(args.url, args, args.seed + i, deadline) for i in range(args.users)]
+    start = time.monotonic()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - start
+
+    routes = {}
+    for label, *_ in MIX:
+        timings = sorted(t for user in users for t in user.results[label]['timings'])
+        status = {}
+        for user in users:
+            for code, count in user.results[label]['status'].items():
+                status[code] = status.get(code, 0) + count
+        errors = sum(user.results[label]['errors'] for user in users)
+        if not timings:
+            routes[label] = {'requests': 0, 'errors': errors}
+            continue
+        routes[label] = {
+            'requests': len(timings),
+            'errors': errors,
+            'status': status,
+            'throughput_rps': len(timings) / elapsed,
+            'latency_ms': {
+                'min': timings[0] * 1000,
+                'p50': percentile(timings, 0.5) * 1000,
+                'p95': percentile(timings, 0.95) * 1000,
+                'p99': percentile(timings, 0.99) * 1000,
+                'max': timings[-1] * 1000,
+            },
+        }
+        print(f"{label:16} {routes[label]['throughput_rps']:8.1f} req/s  "
+              f"p50 {routes[label]['latency_ms']['p50']:8.2f} ms  "
+              f"p99 {routes[label]['latency_ms']['p99']:8.2f} ms  errors {errors}")
+
+    total = sum(route['requests'] for route in routes.values())
+    print(f'{total / elapsed:.1f} req/s overall with {args.users} users')
+    results = {
+        'revision': git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'target': args.url,
+        'users': args.users,
+        'duration_s': elapsed,
+        'throughput_rps': total / elapsed,
+        'routes': routes,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
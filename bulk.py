@@ -0,0 +1,66 @@
+import csv
+import io
+from collections import defaultdict
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Bulk writes.
+#----------------------------------------------------------------------------#
+
+# Multi-row inserts that bypass the ORM, shared by the importer (cli.py)
+# and batch scheduling (scheduling.py). Callers keep the derived data the
+# ORM events would have maintained (counters, updated_at, area directory,
+# caches) current themselves.
+#
+#   write_rows(table, rows)        COPY on Postgres (psycopg2), executemany
+#                                  elsewhere; no ids come back
+#   insert_rows(table, rows)       the new ids, in row order: one INSERT ...
+#                                  RETURNING on Postgres, one INSERT per
+#                                  row elsewhere
+
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return value
+
+
+def write_rows(table, rows):
+    # Inserts `rows` (dicts with the same keys) in one round trip.
+    if not rows:
+        return
+    connection = db.session.connection()
+    if connection.dialect.driver != 'psycopg2':
+        connection.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    names = ', '.join(f'"{column}"' for column in columns)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f'COPY "{table.name}" ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def insert_rows(table, rows):
+    # Inserts `rows` (dicts with the same keys) and returns their ids.
+    if not rows:
+        return []
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return [connection.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+    # RETURNING does not promise the VALUES order: ids are matched back by
+    # the inserted values (equal rows are interchangeable).
+    columns = list(rows[0])
+    returned = defaultdict(list)
+    for id, *values in connection.execute(
+            table.insert().values(rows).returning(table.c.id, *[table.c[column] for column in columns])):
+        returned[tuple(values)].append(id)
+    return [returned[tuple(row[column] for column in columns)].pop() for row in rows]
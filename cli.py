@@ -0,0 +1,538 @@
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, tuple_
+from werkzeug.datastructures import MultiDict
+
+from bulk import write_rows
+from forms import ArtistForm, ShowForm, VenueForm
+from models import (db, areas_materialized, shows_written, sync_areas, Artist, Venue, Show, Genre,
+                    venue_genres, artist_genres)
+from page_cache import cache
+import show_counts
+import areas
+import jobs
+import search_index
+import images
+import assets
+
+#----------------------------------------------------------------------------#
+# Bulk import / export.
+#----------------------------------------------------------------------------#
+
+# flask fyyur import venues venues.csv
+# flask fyyur export shows shows.jsonl
+#
+# Files are CSV (with a header row) or JSON lines, picked by extension.
+# Rows are validated with the same forms as the create pages and written
+# per batch: COPY on Postgres (psycopg2), executemany elsewhere, one
+# commit per batch. Venues and artists are identified by their natural key
+# (name, city, state); a row whose key already exists is skipped. Shows
+# name their venue and artist either by id (venue_id, artist_id) or by
+# natural key (venue_name, venue_city, venue_state, artist_...), resolved
+# with one query per batch. Exports use the same columns, so an export can
+# be imported into another database as is.
+#
+# Bulk writes bypass the ORM events, so imported shows update their venue's
+# and artist's counters and updated_at explicitly (models.shows_written).
+# Each batch marks the area directory stale, and venue and artist batches
+# catch this process's search index up (search_index.sync; other
+# processes catch up on their next search). The cached pages they affect
+# are invalidated once the import finishes.
+
+fyyur = AppGroup('fyyur', help='Bulk import and export of venues, artists and shows.')
+
+KINDS = ('venues', 'artists', 'shows')
+
+NATURAL_KEY = ('name', 'city', 'state')
+
+ENTITY_COLUMNS = {
+    'venues': ('name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+               'website_link', 'seeking_talent', 'seeking_description', 'genres'),
+    'artists': ('name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+                'website_link', 'seeking_venue', 'seeking_description', 'genres'),
+}
+SHOW_COLUMNS = ('venue_name', 'venue_city', 'venue_state',
+                'artist_name', 'artist_city', 'artist_state', 'start_time')
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y')
+
+# CSV cells hold several genres separated by this.
+GENRE_SEPARATOR = ';'
+
+
+class Rejected(Exception):
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _format(path, format):
+    if format:
+        return format
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _read(stream, format):
+    # (line number, dict) for each record.
+    if format == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield number, json.loads(line)
+    else:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _formdata(record):
+    data = MultiDict()
+    for key, value in record.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre.strip() for genre in value.split(GENRE_SEPARATOR)]
+            data.setlist(key, [genre for genre in value if genre])
+        elif key in BOOLEAN_FIELDS:
+            if str(value).strip().lower() in TRUE_VALUES:
+                data[key] = 'y'
+        else:
+            data[key] = str(value)
+    return data
+
+
+def _validate(form, record):
+    # `form` is reused for every row: re-processing it with new formdata is
+    # far cheaper than binding a new form per row.
+    form.process(formdata=_formdata(record))
+    if not form.validate():
+        raise Rejected(form.errors)
+    return form
+
+
+#----------------------------------------------------------------------------#
+# Writing.
+#----------------------------------------------------------------------------#
+
+
+class Importer(object):
+
+    # Rejected rows kept for the summary when no errors file is given.
+    SHOWN_ERRORS = 20
+
+    def __init__(self, batch_size, errors_file=None):
+        self.batch_size = batch_size
+        self.errors_file = errors_file
+        self.imported = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.errors = []
+        # Natural key -> id, per model, filled as keys are resolved.
+        self.ids = {Venue: {}, Artist: {}}
+        self.genre_ids = {}
+        self.touched = set()
+        self.forms = {}
+
+    def form(self, form_class):
+        if form_class not in self.forms:
+            self.forms[form_class] = form_class(formdata=None, meta={'csrf': False})
+        return self.forms[form_class]
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if self.errors_file is not None:
+            self.errors_file.write(json.dumps({'line': line, 'errors': errors}) + '\n')
+        elif len(self.errors) < self.SHOWN_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def resolve(self, model, keys):
+        # Fills self.ids[model] for `keys` with one tuple IN query.
+        known = self.ids[model]
+        missing = list(set(key for key in keys if key not in known))
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = db.session.execute(
+                select(model.name, model.city, model.state, model.id)
+                .where(tuple_(model.name, model.city, model.state).in_(chunk))
+                .order_by(model.id)
+            )
+            for name, city, state, id in rows:
+                known.setdefault((name, city, state), id)
+
+    def resolve_genres(self, names):
+        missing = set(names) - set(self.genre_ids)
+        if not missing:
+            return
+        for id, name in db.session.execute(select(Genre.id, Genre.name).where(Genre.name.in_(missing))):
+            self.genre_ids[name] = id
+        new = [{'name': name} for name in missing if name not in self.genre_ids]
+        if new:
+            write_rows(Genre.__table__, new)
+            for id, name in db.session.execute(
+                    select(Genre.id, Genre.name).where(Genre.name.in_([row['name'] for row in new]))):
+                self.genre_ids[name] = id
+
+    def import_entities(self, kind, records):
+        model, form_class, links, owner = {
+            'venues': (Venue, VenueForm, venue_genres, 'venue_id'),
+            'artists': (Artist, ArtistForm, artist_genres, 'artist_id'),
+        }[kind]
+
+        for batch in _batches(records, self.batch_size):
+            # COPY skips the model's Python-side defaults, so the timestamps
+            # are part of every row.
+            now = datetime.utcnow()
+            valid = {}
+            for line, record in batch:
+                try:
+                    form = _validate(self.form(form_class), record)
+                except Rejected as e:
+                    self.reject(line, e.errors)
+                    continue
+                row = _entity_row(kind, form, now)
+                key = tuple(row[column] for column in NATURAL_KEY)
+                if key in valid:
+                    self.skipped += 1
+                    continue
+                valid[key] = (row, form.genres.data)
+
+            self.resolve(model, valid)
+            new = dict((key, value) for key, value in valid.items() if key not in self.ids[model])
+            self.skipped += len(valid) - len(new)
+            write_rows(model.__table__, [row for row, genres in new.values()])
+
+            self.resolve(model, new)
+            if model is Venue and new:
+                sync_areas(db.session.connection(), [self.ids[Venue][key] for key in new])
+                areas.stale()
+            self.resolve_genres(set(genre for row, genres in new.values() for genre in genres))
+            write_rows(links, [{owner: self.ids[model][key], 'genre_id': self.genre_ids[genre]}
+                               for key, (row, genres) in new.items()
+                               for genre in dict.fromkeys(genres)])
+            db.session.commit()
+            search_index.sync()
+            self.imported += len(new)
+            if new:
+                self.touched.add('group:venues')
+
+    def import_shows(self, records):
+        for batch in _batches(records, self.batch_size):
+            parsed = []
+            for line, record in batch:
+                try:
+                    form = _validate(self.form(ShowForm), record)
+                    venue = _reference(record, 'venue')
+                    artist = _reference(record, 'artist')
+                except Rejected as e:
+                    self.reject(line, e.errors)
+                    continue
+                parsed.append((line, venue, artist, form.start_time.data))
+
+            for model, position in ((Venue, 1), (Artist, 2)):
+                self.resolve(model, [item[position] for item in parsed if isinstance(item[position], tuple)])
+                self._check_ids(model, [item[position] for item in parsed if isinstance(item[position], int)])
+
+            rows = []
+            for line, venue, artist, start_time in parsed:
+                venue_id = self._id(Venue, venue)
+                artist_id = self._id(Artist, artist)
+                if venue_id is None or artist_id is None:
+                    self.reject(line, {'venue' if venue_id is None else 'artist': ['No such record.']})
+                    continue
+                rows.append({'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time})
+                self.touched.add(f'venue:{venue_id}')
+                self.touched.add(f'artist:{artist_id}')
+
+            write_rows(Show.__table__, rows)
+            shows_written(db.session.connection(),
+                          [(row['venue_id'], row['artist_id'], row['start_time']) for row in rows])
+            if rows:
+                areas.stale()
+            db.session.commit()
+            self.imported += len(rows)
+            if rows:
+                self.touched.add('group:venues')
+
+    def _check_ids(self, model, ids):
+        # Explicit ids are looked up once per batch too; existing ones are
+        # remembered under the key ('id', id).
+        known = self.ids[model]
+        missing = list(set(id for id in ids if ('id', id) not in known))
+        if missing:
+            for id, in db.session.execute(select(model.id).where(model.id.in_(missing))):
+                known[('id', id)] = id
+
+    def _id(self, model, reference):
+        if isinstance(reference, int):
+            return self.ids[model].get(('id', reference))
+        return self.ids[model].get(reference)
+
+
+def _entity_row(kind, form, now):
+    row = {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'image_link': form.image_link.data,
+        'facebook_link': form.facebook_link.data,
+        'website': form.website_link.data,
+        'seeking_description': form.seeking_description.data,
+        'created_at': now,
+        'updated_at': now,
+    }
+    if kind == 'venues':
+        row['address'] = form.address.data
+        row['seeking_talent'] = form.seeking_talent.data
+    else:
+        row['seeking_venue'] = form.seeking_venue.data
+    return row
+
+
+def _reference(record, side):
+    # An int id, or a (name, city, state) natural key.
+    id = record.get(f'{side}_id')
+    if id not in (None, ''):
+        try:
+            return int(id)
+        except (TypeError, ValueError):
+            raise Rejected({f'{side}_id': ['Not a valid id.']})
+    key = tuple(record.get(f'{side}_{column}') for column in NATURAL_KEY)
+    if not all(key):
+        raise Rejected({side: [f'Needs {side}_id or {side}_name, {side}_city and {side}_state.']})
+    return tuple(str(value).strip() for value in key)
+
+
+@fyyur.command('import')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per write and commit (IMPORT_BATCH_SIZE).')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Write rejected rows and their errors here as JSON lines.')
+def import_command(kind, path, format, batch_size, errors_path):
+    """Import KIND records from a CSV or JSONL file."""
+    errors_file = open(errors_path, 'w') if errors_path else None
+    importer = Importer(batch_size or current_app.config['IMPORT_BATCH_SIZE'], errors_file)
+    start = time.perf_counter()
+    try:
+        with click.open_file(path) as stream:
+            records = _read(stream, _format(path, format))
+            if kind == 'shows':
+                importer.import_shows(records)
+            else:
+                importer.import_entities(kind, records)
+    finally:
+        cache.invalidate(*importer.touched)
+        if errors_file is not None:
+            errors_file.close()
+    elapsed = time.perf_counter() - start
+
+    click.echo(f'{kind}: {importer.imported} imported, {importer.skipped} already present, '
+               f'{importer.rejected} rejected in {elapsed:.1f} s '
+               f'({importer.imported / elapsed if elapsed else 0:.0f} rows/s)')
+    for error in importer.errors:
+        click.echo(f"  line {error['line']}: {json.dumps(error['errors'])}", err=True)
+    if importer.rejected > len(importer.errors) and errors_file is None:
+        click.echo(f'  ... {importer.rejected - len(importer.errors)} more (use --errors FILE)', err=True)
+    if importer.rejected:
+        sys.exit(1)
+
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+
+def _entity_records(kind, batch_size):
+    model, links, owner = {
+        'venues': (Venue, venue_genres, 'venue_id'),
+        'artists': (Artist, artist_genres, 'artist_id'),
+    }[kind]
+    table = model.__table__
+    columns = [table.c.website if column == 'website_link' else table.c[column]
+               for column in ENTITY_COLUMNS[kind] if column != 'genres']
+    query = select(table.c.id, *columns).order_by(table.c.id)
+    result = db.session.execute(query.execution_options(stream_results=True))
+    for rows in result.partitions(batch_size):
+        genres = dict((row.id, []) for row in rows)
+        for id, name in db.session.execute(
+                select(links.c[owner], Genre.name).join(Genre, Genre.id == links.c.genre_id)
+                .where(links.c[owner].in_(list(genres))).order_by(Genre.name)):
+            genres[id].append(name)
+        for row in rows:
+            record = dict(zip(ENTITY_COLUMNS[kind], row[1:]))
+            record['genres'] = genres[row.id]
+            yield record
+
+
+def _show_records(batch_size):
+    query = select(
+        Venue.name, Venue.city, Venue.state, Artist.name, Artist.city, Artist.state,
+        Show.start_time
+    ).select_from(Show).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id).order_by(Show.id)
+    result = db.session.execute(query.execution_options(stream_results=True))
+    for row in (row for rows in result.partitions(batch_size) for row in rows):
+        record = dict(zip(SHOW_COLUMNS, row))
+        record['start_time'] = row[-1].strftime('%Y-%m-%d %H:%M:%S')
+        yield record
+
+
+@fyyur.command('export')
+@click.argument('kind', type=click.Choice(KINDS))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows fetched per round trip (IMPORT_BATCH_SIZE).')
+def export_command(kind, path, format, batch_size):
+    """Export all KIND records to a CSV or JSONL file, streaming."""
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    format = _format(path, format)
+    if kind == 'shows':
+        columns, records = SHOW_COLUMNS, _show_records(batch_size)
+    else:
+        columns, records = ENTITY_COLUMNS[kind], _entity_records(kind, batch_size)
+
+    count = 0
+    with click.open_file(path, 'w') as stream:
+        writer = None
+        if format == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=columns)
+            writer.writeheader()
+        for record in records:
+            if writer is not None:
+                if 'genres' in record:
+                    record['genres'] = GENRE_SEPARATOR.join(record['genres'])
+                writer.writerow(record)
+            else:
+                stream.write(json.dumps(record, default=str) + '\n')
+            count += 1
+    click.echo(f'{kind}: {count} exported', err=True)
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+
+@fyyur.command('roll-over-counts')
+def roll_over_counts_command():
+    """Move shows that have started from the upcoming to the past counters."""
+    moved = show_counts.roll_over()
+    click.echo(f'{moved} shows moved to past')
+    if areas_materialized(db.session.connection()):
+        # The view copies the counters; the table follows them by itself.
+        areas.refresh()
+
+
+@fyyur.command('check-counts')
+@click.option('--repair', is_flag=True, help='Reset drifted counters to the recomputed values.')
+def check_counts_command(repair):
+    """Recompute the show counters and report (or repair) drift."""
+    drift = show_counts.check(repair=repair)
+    for kind, id, stored, actual in drift:
+        click.echo(f'{kind} {id}: stored upcoming/past {stored[0]}/{stored[1]}, '
+                   f'actual {actual[0]}/{actual[1]}')
+    if drift and repair:
+        # Listings and searches show the counters.
+        cache.invalidate('group:venues')
+        click.echo(f'{len(drift)} counters repaired')
+    elif drift:
+        click.echo(f'{len(drift)} counters drifted (use --repair)')
+        sys.exit(1)
+    else:
+        click.echo('counters consistent')
+
+
+@fyyur.command('refresh-areas')
+def refresh_areas_command():
+    """Rebuild the area directory behind /venues."""
+    areas.refresh()
+    cache.invalidate('group:venues')
+    click.echo('area directory refreshed')
+
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+
+
+@fyyur.command('worker')
+@click.option('--once', is_flag=True, help='Exit when no job is due instead of polling.')
+def worker_command(once):
+    """Run jobs from the job table (JOBS_BACKEND = 'database')."""
+    jobs.work(current_app.config, once=once)
+
+
+@fyyur.command('dead-jobs')
+@click.option('--requeue', is_flag=True, help='Queue them again with fresh attempts.')
+def dead_jobs_command(requeue):
+    """List dead-lettered jobs of the job table."""
+    dead = jobs.Job.query.filter_by(state='dead').order_by(jobs.Job.id).all()
+    for job in dead:
+        error = (job.last_error or '').strip().splitlines()
+        click.echo(f'{job.id} {job.name} {job.args} after {job.attempts} attempts: '
+                   f'{error[-1] if error else ""}')
+        if requeue:
+            job.state, job.attempts, job.locked_until = 'queued', 0, None
+            job.run_at = datetime.utcnow()
+    db.session.commit()
+    click.echo(f'{len(dead)} dead jobs{" requeued" if requeue and dead else ""}')
+
+
+#----------------------------------------------------------------------------#
+# Images.
+#----------------------------------------------------------------------------#
+
+
+@fyyur.command('ingest-images')
+def ingest_images_command():
+    """Build the thumbnails of image links not fetched yet."""
+    links = set()
+    for model in images.MODELS:
+        links.update(db.session.execute(
+            select(model.image_link).where(model.image_link.isnot(None), model.image_link != '',
+                                           model.image_digest.is_(None)).distinct()).scalars())
+    if current_app.config['JOBS_BACKEND'] == 'database':
+        for link in sorted(links):
+            jobs.enqueue('images.ingest', link, dedupe=True)
+        click.echo(f'{len(links)} image links queued')
+        return
+    # Threads would die with this command, so the links are fetched here.
+    for link in sorted(links):
+        images.ingest(link)
+    click.echo(f'{len(links)} image links ingested')
+
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+
+@fyyur.command('build-assets')
+def build_assets_command():
+    """Bundle, minify and fingerprint static/ into ASSETS_DIR."""
+    manifest = assets.build(current_app.static_folder, current_app.config['ASSETS_DIR'])
+    # Files of earlier builds stay, for pages rendered before the deploy.
+    current_app.extensions['assets'] = manifest
+    click.echo(f'{len(manifest)} assets written to {current_app.config["ASSETS_DIR"]}')
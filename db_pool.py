@@ -0,0 +1,108 @@
+import threading
+import time
+
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+# Pool sizing comes from the DATABASE_POOL_* settings in config.py (each
+# overridable from the environment). Every worker process holds its own
+# pool, so workers * (DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW) must stay
+# below the server's max_connections.
+#
+# The pool is an InstrumentedQueuePool, which records how long checkouts
+# wait for a connection and how many connections are opened and closed
+# (churn). stats() reports those together with the current checked-out and
+# overflow counts; /_internal/pool serves them as JSON.
+
+
+class InstrumentedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def _create_connection(self):
+        record = super()._create_connection()
+        with self._stats_lock:
+            self.connects += 1
+        return record
+
+    def _close_connection(self, connection, *args, **kw):
+        with self._stats_lock:
+            self.disconnects += 1
+        return super()._close_connection(connection, *args, **kw)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'pool_size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': max(0, self.overflow()),
+                'checkouts': self.checkouts,
+                'wait_seconds_total': self.wait_total,
+                'wait_seconds_max': self.wait_max,
+                'wait_seconds_avg': self.wait_total / self.checkouts if self.checkouts else 0.0,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'disconnects': self.disconnects,
+            }
+
+
+def engine_options(config):
+    # SQLALCHEMY_ENGINE_OPTIONS for config's database. SQLite keeps the
+    # pool Flask-SQLAlchemy picks for it; a queue pool and a server-side
+    # statement timeout only apply to client/server databases.
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        return {}
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DATABASE_POOL_SIZE'],
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+        'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+        'pool_pre_ping': config['DATABASE_POOL_PRE_PING'],
+    }
+    timeout = config['DATABASE_STATEMENT_TIMEOUT_MS']
+    if timeout and url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'options': f'-c statement_timeout={int(timeout)}'}
+    return options
+
+
+def stats():
+    # Current pool figures for the app's engine. Pools other than
+    # InstrumentedQueuePool (SQLite) only report their class and status.
+    pool = db.engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {'pool': type(pool).__name__, 'status': pool.status()}
@@ -6,8 +6,13 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
+        # The test suite must pass, query plans must use their indexes and
+        # no route may fail on a small seeded database.
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q && "
+            "python -m bench.explain_plans && "
+            "python -m bench.bench_routes --venues 200 --artists 500 --shows 5000 "
+            "--requests 5 --writes --output bench-smoke.json", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -39,9 +44,10 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # pytest is not installed on the dyno; the plan checks run there on the
+    # deployed code and packages, against the app's own database (quoted so
+    # $DATABASE_URL expands on the dyno, not here).
+    local("heroku run 'python -m bench.explain_plans --database-url \"$DATABASE_URL\"'")
 
 
 def deploy():
@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+#----------------------------------------------------------------------------#
+# Datetime formatting.
+#----------------------------------------------------------------------------#
+
+# Backs the `datetime` Jinja filter, which runs once per show on listing
+# and detail pages. Compiled Babel patterns are cached per (format, locale)
+# and rendered strings are memoized in a bounded LRU, so repeated start
+# times cost a dictionary lookup. Datetimes are used as they are; strings
+# are still accepted and parsed.
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+RENDERED_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(format, locale):
+    return parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=RENDERED_CACHE_SIZE)
+def _render(value, format, locale):
+    pattern, babel_locale = compiled_pattern(format, locale)
+    # Babel treats naive datetimes as UTC; do the same without converting.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, babel_locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(str(value))
+    return _render(value, format, locale)
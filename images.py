@@ -0,0 +1,247 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import re
+import socket
+import tempfile
+import urllib.error
+import urllib.request
+
+from flask import Blueprint, abort, current_app, send_from_directory, url_for
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Artist, Venue
+import jobs
+
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#----------------------------------------------------------------------------#
+
+# Venue and artist image_links point anywhere, at any size. Each link is
+# fetched once, by a background job queued when a write sets it, and
+# scaled down to WebP thumbnails of IMAGE_THUMBNAIL_WIDTHS pixels (never
+# up: a narrower image is stored at its own width under each name). The
+# files are named after the SHA-256 of the fetched bytes,
+#
+#   IMAGE_DIR/<digest[:2]>/<digest>-<width>.webp
+#
+# so they never change once written and are served with an immutable,
+# year-long Cache-Control. The digest is stored on the row (image_digest)
+# and pages render a srcset of the thumbnails through the image macro in
+# templates/macros/images.html; until then they keep the remote link.
+#
+# Rows written without the ORM (`flask fyyur import`) are picked up by
+#
+#   flask fyyur ingest-images
+#
+# Links are user input fetched by the server, so fetch() only connects to
+# public addresses: every address a host resolves to is checked when the
+# connection is made, for the link and for each redirect it follows, and
+# loopback, private, link-local (cloud metadata) and other non-global
+# addresses are refused. IMAGE_ALLOW_PRIVATE_HOSTS lifts this for tests
+# and local image servers. No proxy is used, so the address checked is the
+# one connected to.
+#
+# Thumbnails need Pillow, imported only when IMAGE_THUMBNAILS is on.
+
+images = Blueprint('images', __name__)
+
+DIGEST = re.compile('^[0-9a-f]{64}$')
+
+# A year, the longest lifetime caches honour.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+MODELS = (Venue, Artist)
+
+
+def init_app(app):
+    if app.config.get('IMAGE_THUMBNAILS'):
+        # Optional dependency, only needed to build thumbnails.
+        import PIL
+    app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+    app.jinja_env.globals['thumbnail_srcset'] = thumbnail_srcset
+
+
+def _path(digest, width):
+    return os.path.join(digest[:2], f'{digest}-{width}.webp')
+
+
+def thumbnail_url(digest, width=None):
+    # Without a width, a middle one: the src for clients ignoring srcset.
+    if width is None:
+        widths = current_app.config['IMAGE_THUMBNAIL_WIDTHS']
+        width = widths[len(widths) // 2]
+    return url_for('images.thumbnail', digest=digest, width=width)
+
+
+def thumbnail_srcset(digest):
+    return ', '.join(f'{thumbnail_url(digest, width)} {width}w'
+                     for width in current_app.config['IMAGE_THUMBNAIL_WIDTHS'])
+
+
+def _stored(directory, digest, widths):
+    return all(os.path.exists(os.path.join(directory, _path(digest, width))) for width in widths)
+
+
+class BlockedAddress(ValueError):
+    pass
+
+
+def public_address(address):
+    return address.is_global and not address.is_multicast
+
+
+def _public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    # socket.create_connection, refusing hosts with any non-public address.
+    host, port = address
+    resolved = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    for family, type, proto, canonname, sockaddr in resolved:
+        if not public_address(ipaddress.ip_address(sockaddr[0])):
+            raise BlockedAddress(f'{host} resolves to the non-public address {sockaddr[0]}')
+    error = None
+    for family, type, proto, canonname, sockaddr in resolved:
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+def _opener(allow_private):
+    # http(s) only, redirects included, and no proxy.
+    opener = urllib.request.OpenerDirector()
+    handlers = [urllib.request.HTTPHandler(), urllib.request.HTTPSHandler()] if allow_private \
+        else [_PublicHTTPHandler(), _PublicHTTPSHandler()]
+    for handler in handlers + [urllib.request.HTTPRedirectHandler(),
+                               urllib.request.HTTPDefaultErrorHandler(),
+                               urllib.request.HTTPErrorProcessor()]:
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch(url, config):
+    # The body of `url`, refusing anything but http(s), hosts on non-public
+    # addresses (see above) and bodies over IMAGE_MAX_BYTES.
+    if not url.lower().startswith(('http://', 'https://')):
+        raise ValueError(f'not an http(s) url: {url}')
+    request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-images'})
+    opener = _opener(config['IMAGE_ALLOW_PRIVATE_HOSTS'])
+    with opener.open(request, timeout=config['IMAGE_FETCH_TIMEOUT']) as response:
+        body = response.read(config['IMAGE_MAX_BYTES'] + 1)
+    if len(body) > config['IMAGE_MAX_BYTES']:
+        raise ValueError(f'image over {config["IMAGE_MAX_BYTES"]} bytes: {url}')
+    return body
+
+
+def write_thumbnails(body, directory, widths, quality):
+    # Stores the WebP thumbnails of the image in `body` and returns its
+    # digest. Raises PIL.UnidentifiedImageError when it is not an image.
+    # Thumbnails already stored under the digest are kept.
+    from PIL import Image, ImageOps
+
+    digest = hashlib.sha256(body).hexdigest()
+    if _stored(directory, digest, widths):
+        return digest
+    with Image.open(io.BytesIO(body)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        os.makedirs(os.path.join(directory, digest[:2]), exist_ok=True)
+        for width in widths:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((width, width * 4))
+            # Written aside and renamed, so a file is never seen half done.
+            fd, temporary = tempfile.mkstemp(dir=os.path.join(directory, digest[:2]))
+            with os.fdopen(fd, 'wb') as f:
+                thumbnail.save(f, 'WEBP', quality=quality)
+            os.replace(temporary, os.path.join(directory, _path(digest, width)))
+    return digest
+
+
+@jobs.task('images.ingest')
+def ingest(url):
+    # Builds the thumbnails of `url` and records their digest on every
+    # venue and artist still linking to it.
+    config = current_app.config
+    directory, widths = config['IMAGE_DIR'], config['IMAGE_THUMBNAIL_WIDTHS']
+    owners = [owner for model in MODELS
+              for owner in model.query.filter(model.image_link == url).all()]
+
+    # Fetched once: reuse the thumbnails of any owner that has them.
+    digest = next((owner.image_digest for owner in owners if owner.image_digest and
+                   _stored(directory, owner.image_digest, widths)), None)
+    if digest is None and owners:
+        from PIL import Image, UnidentifiedImageError
+        try:
+            digest = write_thumbnails(fetch(url, config), directory, widths,
+                                      config['IMAGE_WEBP_QUALITY'])
+        except (urllib.error.HTTPError, UnidentifiedImageError, Image.DecompressionBombError,
+                ValueError) as error:
+            # Retrying will not turn these into an image; pages keep the link.
+            if isinstance(error, urllib.error.HTTPError) and error.code >= 500:
+                raise
+            current_app.logger.warning(f'image {url} not ingested: {error}')
+            return
+
+    changed = [owner for owner in owners if owner.image_digest != digest]
+    for owner in changed:
+        owner.image_digest = digest
+    if changed:
+        db.session.commit()
+
+
+@event.listens_for(Session, 'before_flush')
+def _forget_old_image(session, flush_context, instances):
+    # The digest belongs to the previous link until the new one is fetched.
+    for obj in session.dirty:
+        if isinstance(obj, MODELS) and inspect(obj).attrs.image_link.history.has_changes():
+            obj.image_digest = None
+
+
+@event.listens_for(Session, 'after_flush')
+def _ingest_new_links(session, flush_context):
+    if not current_app.config.get('IMAGE_THUMBNAILS'):
+        return
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, MODELS) and obj.image_link and obj.image_digest is None and \
+                inspect(obj).attrs.image_link.history.has_changes():
+            jobs.defer('images.ingest', obj.image_link, dedupe=True)
+
+
+@images.route('/<digest>-<int:width>.webp')
+def thumbnail(digest, width):
+    if not DIGEST.match(digest) or width not in current_app.config['IMAGE_THUMBNAIL_WIDTHS']:
+        abort(404)
+    response = send_from_directory(current_app.config['IMAGE_DIR'], _path(digest, width),
+                                   mimetype='image/webp', max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
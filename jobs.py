@@ -0,0 +1,278 @@
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+
+# Work that does not have to finish before the response (shared cache
+# invalidation, in-memory search index updates, area directory refreshes)
+# runs as a job: a named task registered with @task and JSON-serialisable
+# arguments.
+#
+#   defer(name, *args)     inside a transaction: queued once it commits,
+#                          dropped if it rolls back
+#   enqueue(name, *args)   queued now, e.g. from an after_commit hook
+#
+# JOBS_BACKEND picks where jobs run:
+#
+#   "thread"    a pool of JOBS_THREADS threads in the web process (default)
+#   "database"  rows of the job table, run by `flask fyyur worker`
+#                processes
+#
+# Tasks declared local=True change this process's memory (the search
+# index) and always run on the thread pool. A failing job is retried up to
+# JOB_MAX_ATTEMPTS times with exponential backoff and then dead-lettered:
+# kept with its error (state "dead") in the table, or in DEAD_LETTERS and
+# the log for threads.
+
+TASKS = {}
+
+PENDING_KEY = 'jobs_pending'
+
+# Dead-lettered thread jobs of this process, newest last.
+DEAD_LETTERS = deque(maxlen=100)
+
+
+class Task(object):
+
+    def __init__(self, name, func, local=False):
+        self.name = name
+        self.func = func
+        self.local = local
+
+
+def task(name, local=False):
+    def decorator(func):
+        TASKS[name] = Task(name, func, local)
+        return func
+    return decorator
+
+
+def backoff(config, attempts):
+    # Seconds before the retry following the `attempts`-th failure.
+    delay = config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1)
+    return min(delay, config['JOB_RETRY_MAX_DELAY'])
+
+
+def run(name, args):
+    TASKS[name].func(*args)
+
+
+#----------------------------------------------------------------------------#
+# Thread backend.
+#----------------------------------------------------------------------------#
+
+
+class ThreadPool(object):
+
+    def __init__(self, app):
+        self.app = app
+        self.size = app.config['JOBS_THREADS']
+        self.queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads start on first use, and again in a process forked after
+        # that (a preloading server), which does not inherit them.
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.queue = queue.Queue()
+            self._pending = set()
+            for _ in range(self.size):
+                threading.Thread(target=self._work, daemon=True, name='fyyur-job').start()
+
+    def submit(self, name, args, dedupe=False, attempts=0, delay=0):
+        self._ensure_started()
+        key = (name, json.dumps(args))
+        if dedupe:
+            with self._lock:
+                if key in self._pending:
+                    return
+                self._pending.add(key)
+        item = (name, args, key if dedupe else None, attempts)
+        if delay:
+            timer = threading.Timer(delay, self.queue.put, (item,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.queue.put(item)
+
+    def _work(self):
+        while True:
+            name, args, key, attempts = self.queue.get()
+            if key is not None:
+                with self._lock:
+                    self._pending.discard(key)
+            attempts += 1
+            try:
+                with self.app.app_context():
+                    run(name, args)
+            except Exception:
+                error = traceback.format_exc()
+                if attempts >= self.app.config['JOB_MAX_ATTEMPTS']:
+                    DEAD_LETTERS.append({'name': name, 'args': args, 'attempts': attempts,
+                                         'error': error, 'at': datetime.utcnow().isoformat()})
+                    self.app.logger.error(f'job {name} dead after {attempts} attempts\n{error}')
+                else:
+                    self.app.logger.warning(f'job {name} failed (attempt {attempts}), retrying\n{error}')
+                    self.submit(name, args, attempts=attempts,
+                                delay=backoff(self.app.config, attempts))
+
+
+#----------------------------------------------------------------------------#
+# Database backend.
+#----------------------------------------------------------------------------#
+
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        # The worker's claim query: due queued jobs, oldest first.
+        db.Index('ix_job_state_run_at', 'state', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    args = db.Column(db.Text, nullable=False)
+    # "queued" until it succeeds (the row is deleted) or is dead-lettered.
+    state = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Set while a worker runs the job; a crashed worker's claim expires.
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+def _insert_jobs(connection, jobs):
+    # Dedupe jobs are skipped while an identical one is still waiting.
+    now = datetime.utcnow()
+    rows = []
+    for name, args, dedupe in jobs:
+        encoded = json.dumps(args)
+        if dedupe and connection.execute(
+                select(Job.id).where(Job.name == name, Job.args == encoded, Job.state == 'queued',
+                                     Job.locked_until.is_(None)).limit(1)).first():
+            continue
+        rows.append({'name': name, 'args': encoded, 'state': 'queued', 'attempts': 0,
+                     'run_at': now, 'created_at': now})
+    if rows:
+        connection.execute(Job.__table__.insert(), rows)
+
+
+def claim(lease):
+    # Locks the next due job for `lease` seconds and returns it, or None.
+    # SKIP LOCKED (Postgres) keeps workers off each other's rows; the
+    # conditional update makes the claim safe where it is unsupported.
+    now = datetime.utcnow()
+    free = or_(Job.locked_until.is_(None), Job.locked_until < now)
+    id = db.session.execute(
+        select(Job.id).where(Job.state == 'queued', Job.run_at <= now, free)
+        .order_by(Job.run_at, Job.id).limit(1).with_for_update(skip_locked=True)
+    ).scalar()
+    if id is None:
+        db.session.rollback()
+        return None
+    claimed = db.session.execute(
+        update(Job).where(Job.id == id, free).values(
+            locked_until=now + timedelta(seconds=lease), attempts=Job.attempts + 1)
+    ).rowcount
+    db.session.commit()
+    return db.session.get(Job, id) if claimed else None
+
+
+def run_claimed(job, config):
+    # Runs a claimed job, then deletes it, schedules its retry or
+    # dead-letters it. Returns True when it succeeded.
+    try:
+        run(job.name, json.loads(job.args))
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = traceback.format_exc()
+        job.locked_until = None
+        if job.attempts >= config['JOB_MAX_ATTEMPTS']:
+            job.state = 'dead'
+            current_app.logger.error(f'job {job.name} dead after {job.attempts} attempts\n{job.last_error}')
+        else:
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff(config, job.attempts))
+            current_app.logger.warning(f'job {job.name} failed (attempt {job.attempts}), retrying')
+        db.session.commit()
+        return False
+    db.session.delete(db.session.get(Job, job.id))
+    db.session.commit()
+    return True
+
+
+def work(config, once=False):
+    # The worker loop: runs due jobs, sleeping JOB_POLL_INTERVAL when there
+    # are none. With once=True it returns when the queue has nothing due.
+    while True:
+        job = claim(config['JOB_LEASE'])
+        if job is None:
+            if once:
+                return
+            time.sleep(config['JOB_POLL_INTERVAL'])
+            continue
+        run_claimed(job, config)
+        db.session.remove()
+
+
+#----------------------------------------------------------------------------#
+# Queueing.
+#----------------------------------------------------------------------------#
+
+
+def init_app(app):
+    app.extensions['jobs'] = ThreadPool(app)
+
+
+def enqueue(name, *args, dedupe=False):
+    if name not in TASKS:
+        raise KeyError(f'unknown job {name}')
+    app = current_app._get_current_object()
+    if TASKS[name].local or app.config['JOBS_BACKEND'] != 'database':
+        app.extensions['jobs'].submit(name, list(args), dedupe)
+    else:
+        # Outside the caller's transaction, which may already be over.
+        with db.engine.begin() as connection:
+            _insert_jobs(connection, [(name, list(args), dedupe)])
+
+
+def defer(name, *args, dedupe=False):
+    if name not in TASKS:
+        raise KeyError(f'unknown job {name}')
+    # Begin the transaction if nothing has yet, so that a rollback before
+    # any statement still fires after_rollback and drops the job.
+    session = db.session()
+    if not session.in_transaction():
+        session.begin()
+    session.info.setdefault(PENDING_KEY, []).append((name, list(args), dedupe))
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_pending(session):
+    for name, args, dedupe in session.info.pop(PENDING_KEY, []):
+        enqueue(name, *args, dedupe=dedupe)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
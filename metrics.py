@@ -0,0 +1,287 @@
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import (before_render_template, current_app, g, has_request_context,
+                   request, template_rendered)
+
+import profiling
+
+#----------------------------------------------------------------------------#
+# Metrics registry.
+#----------------------------------------------------------------------------#
+
+# Request, DB and template render latency histograms, response sizes and
+# page cache hits per endpoint, served on /metrics in the Prometheus text
+# format (p50/p99 come from histogram_quantile() on the _bucket series).
+#
+# Updates take no lock: every thread writes to its own shard, and shards
+# are only summed when /metrics is scraped. With several worker processes
+# (gunicorn) set METRICS_DIR to a directory shared by the workers of one
+# deployment, emptied when it starts: each process periodically writes its
+# totals to metrics-<pid>.json there and a scrape, whichever worker serves
+# it, adds up every file.
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# name: (type, help, buckets)
+METRICS = {
+    'fyyur_requests_total': (
+        'counter', 'Requests handled, by endpoint and status.', None),
+    'fyyur_request_duration_seconds': (
+        'histogram', 'Total time spent handling a request.', TIME_BUCKETS),
+    'fyyur_request_db_seconds': (
+        'histogram', 'Time spent in SQL statements per request.', TIME_BUCKETS),
+    'fyyur_request_template_seconds': (
+        'histogram', 'Time spent rendering templates per request.', TIME_BUCKETS),
+    'fyyur_template_render_seconds': (
+        'histogram', 'Render time of each template.', TIME_BUCKETS),
+    'fyyur_response_bytes': (
+        'histogram', 'Response body size.', SIZE_BUCKETS),
+    'fyyur_page_cache_total': (
+        'counter', 'Page cache lookups, by endpoint and result.', None),
+}
+
+
+class Registry(object):
+
+    def __init__(self):
+        self._local = threading.local()
+        # (weak reference to the writing thread, its shard)
+        self._shards = []
+        # Totals of the shards of threads that have exited.
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            # Only taken once per thread, never on the update path.
+            with self._shards_lock:
+                self._retire_exited()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+            self._local.shard = shard
+        return shard
+
+    def _retire_exited(self):
+        # Folds the shards of exited threads into _retired, so servers that
+        # start a thread per request keep a bounded list. Called with
+        # _shards_lock held; an exited thread no longer writes its shard.
+        live = []
+        for thread, shard in self._shards:
+            current = thread()
+            if current is not None and current.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, values in shard.items():
+                    _add(self._retired, key, values)
+        self._shards = live
+
+    def inc(self, name, labels, amount=1):
+        shard = self._shard()
+        key = (name, labels)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0]
+        values[0] += amount
+
+    def observe(self, name, labels, value):
+        # Histogram values are per-bucket counts (the last bucket is +Inf)
+        # followed by the sum and count of observations.
+        buckets = METRICS[name][2]
+        shard = self._shard()
+        key = (name, labels)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(buckets) + 3)
+        values[bisect_left(buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def snapshot(self):
+        with self._shards_lock:
+            self._retire_exited()
+            shards = [shard for thread, shard in self._shards]
+            totals = dict((key, list(values)) for key, values in self._retired.items())
+        for shard in shards:
+            for key, values in list(shard.items()):
+                _add(totals, key, values)
+        return totals
+
+    def clear(self):
+        with self._shards_lock:
+            self._retired.clear()
+            for thread, shard in self._shards:
+                shard.clear()
+
+
+def _add(totals, key, values):
+    current = totals.get(key)
+    if current is None:
+        totals[key] = list(values)
+    else:
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+registry = Registry()
+
+
+#----------------------------------------------------------------------------#
+# Multi-process aggregation.
+#----------------------------------------------------------------------------#
+
+_last_flush = 0.0
+
+
+def _process_file(directory):
+    return os.path.join(directory, f'metrics-{os.getpid()}.json')
+
+
+def flush(directory):
+    global _last_flush
+    _last_flush = time.monotonic()
+    entries = [[name, labels, values]
+               for (name, labels), values in registry.snapshot().items()]
+    path = _process_file(directory)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(entries, f)
+    os.replace(path + '.tmp', path)
+
+
+def collect(directory=None):
+    # Totals across every process writing to `directory` (or of this
+    # process alone without one), including this process's latest values.
+    if directory is None:
+        return registry.snapshot()
+
+    flush(directory)
+    totals = {}
+    for filename in os.listdir(directory):
+        if not (filename.startswith('metrics-') and filename.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, values in entries:
+            _add(totals, (name, tuple(tuple(pair) for pair in labels)), values)
+    return totals
+
+
+#----------------------------------------------------------------------------#
+# Prometheus text format.
+#----------------------------------------------------------------------------#
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(totals):
+    lines = []
+    for name, (kind, help, buckets) in METRICS.items():
+        series = sorted((labels, values) for (metric, labels), values in totals.items()
+                        if metric == name)
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, values in series:
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(values[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {values[-1]}')
+            else:
+                lines.append(f'{name}{_labels(labels)} {_number(values[0])}')
+
+    hits = sum(values[0] for (metric, labels), values in totals.items()
+               if metric == 'fyyur_page_cache_total' and ('result', 'hit') in labels)
+    lookups = sum(values[0] for (metric, labels), values in totals.items()
+                  if metric == 'fyyur_page_cache_total')
+    lines.append('# HELP fyyur_page_cache_hit_ratio Share of page cache lookups served from the cache.')
+    lines.append('# TYPE fyyur_page_cache_hit_ratio gauge')
+    lines.append(f'fyyur_page_cache_hit_ratio {_number(hits / lookups if lookups else 0.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Flask hooks.
+#----------------------------------------------------------------------------#
+
+
+def _start():
+    g.metrics_started = time.perf_counter()
+    g.template_time = 0.0
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    if not has_request_context() or not g.get('template_started'):
+        return
+    duration = time.perf_counter() - g.template_started.pop()
+    g.template_time = g.get('template_time', 0.0) + duration
+    registry.observe('fyyur_template_render_seconds', (('template', template.name),), duration)
+
+
+def _finish(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+
+    endpoint = (('endpoint', request.endpoint or 'none'),)
+    registry.inc('fyyur_requests_total', endpoint + (('status', response.status_code),))
+    registry.observe('fyyur_request_duration_seconds', endpoint, time.perf_counter() - started)
+    registry.observe('fyyur_request_template_seconds', endpoint, g.get('template_time', 0.0))
+
+    profile = profiling.current_profile()
+    if profile is not None:
+        registry.observe('fyyur_request_db_seconds', endpoint, profile.db_time)
+
+    size = response.calculate_content_length()
+    if size is not None:
+        registry.observe('fyyur_response_bytes', endpoint, size)
+
+    cache_hit = g.get('page_cache_hit')
+    if cache_hit is not None:
+        registry.inc('fyyur_page_cache_total',
+                     endpoint + (('result', 'hit' if cache_hit else 'miss'),))
+
+    directory = current_app.config.get('METRICS_DIR')
+    interval = current_app.config['METRICS_FLUSH_INTERVAL']
+    if directory and time.monotonic() - _last_flush > interval:
+        flush(directory)
+    return response
+
+
+def init_app(app):
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.extensions['metrics'] = registry
@@ -0,0 +1,71 @@
+"""Name search indexes.
+
+Revision ID: 3f1c9a7d2b64
+Revises: ad40182d0e2e
+Create Date: 2026-10-18 09:12:05.114302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'ad40182d0e2e'
+branch_labels = None
+depends_on = None
+
+
+# SQLite has no trigram indexes; names are mirrored into FTS5 trigram
+# tables kept current by triggers instead (see search.py).
+FTS_TABLES = {
+    'Venue': 'venue_fts',
+    'Artist': 'artist_fts',
+}
+
+
+def sqlite_fts_ddl(table, fts):
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+        f"INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in FTS_TABLES:
+            op.create_index(f'ix_{table}_name_trgm', table, ['name'],
+                            postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'})
+
+    elif dialect == 'sqlite':
+        for table, fts in FTS_TABLES.items():
+            for statement in sqlite_fts_ddl(table, fts):
+                op.execute(statement)
+            op.create_index(f'ix_{table}_name_trgm', table, ['name'])
+
+    else:
+        for table in FTS_TABLES:
+            op.create_index(f'ix_{table}_name_trgm', table, ['name'])
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    for table, fts in FTS_TABLES.items():
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        if dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')
@@ -0,0 +1,31 @@
+"""Venue and Artist updated_at.
+
+Revision ID: 5d8a3c1f7e92
+Revises: c47d19e3a5f0
+Create Date: 2026-10-18 14:05:12.408311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a3c1f7e92'
+down_revision = 'c47d19e3a5f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start at the migration time; the application sets the
+    # column from then on.
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                          server_default=sa.func.now()))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
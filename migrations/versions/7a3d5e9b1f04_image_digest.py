@@ -0,0 +1,29 @@
+"""Venue and Artist image_digest.
+
+Revision ID: 7a3d5e9b1f04
+Revises: 2b6f0d8e4c17
+Create Date: 2026-10-18 19:21:46.203117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3d5e9b1f04'
+down_revision = '2b6f0d8e4c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing links are fetched by `flask fyyur ingest-images`.
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('image_digest', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('image_digest')
@@ -0,0 +1,97 @@
+"""Genre association tables.
+
+Revision ID: 8b2e4f6a1c39
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 10:41:27.503918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c39'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+
+# Owner table -> (association table, owner key column)
+OWNERS = {
+    'Venue': ('venue_genres', 'venue_id'),
+    'Artist': ('artist_genres', 'artist_id'),
+}
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    links = {}
+    for owner, (table, key) in OWNERS.items():
+        links[owner] = op.create_table(table,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [f'{owner}.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index(f'ix_{table}_genre_id', table, ['genre_id', key])
+
+    # Split the comma-joined strings into Genre rows and associations.
+    bind = op.get_bind()
+    rows = {}
+    names = {}
+    for owner in OWNERS:
+        rows[owner] = bind.execute(
+            sa.text(f'SELECT id, genres FROM "{owner}"')).fetchall()
+        for id, genres in rows[owner]:
+            for name in (genres or '').split(','):
+                if name.strip():
+                    names.setdefault(name.strip(), None)
+
+    if names:
+        op.bulk_insert(genre, [{'name': name} for name in names])
+        for id, name in bind.execute(sa.text('SELECT id, name FROM "Genre"')):
+            names[name] = id
+
+    for owner, (table, key) in OWNERS.items():
+        associations = set()
+        for id, genres in rows[owner]:
+            for name in (genres or '').split(','):
+                if name.strip():
+                    associations.add((id, names[name.strip()]))
+        if associations:
+            op.bulk_insert(links[owner], [
+                {key: id, 'genre_id': genre_id} for id, genre_id in sorted(associations)
+            ])
+
+    for owner in OWNERS:
+        op.drop_column(owner, 'genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for owner, (table, key) in OWNERS.items():
+        op.add_column(owner, sa.Column('genres', sa.String(), nullable=True))
+
+        joined = {}
+        for id, name in bind.execute(sa.text(
+                f'SELECT l.{key}, g.name FROM {table} l JOIN "Genre" g ON g.id = l.genre_id '
+                f'ORDER BY l.{key}, g.name')):
+            joined.setdefault(id, []).append(name)
+        for id, genres in joined.items():
+            bind.execute(sa.text(f'UPDATE "{owner}" SET genres = :genres WHERE id = :id'),
+                         {'genres': ','.join(genres), 'id': id})
+        bind.execute(sa.text(f'UPDATE "{owner}" SET genres = \'\' WHERE genres IS NULL'))
+
+        if bind.dialect.name != 'sqlite':
+            op.alter_column(owner, 'genres', existing_type=sa.String(), nullable=False)
+
+        op.drop_index(f'ix_{table}_genre_id', table_name=table)
+        op.drop_table(table)
+
+    op.drop_table('Genre')
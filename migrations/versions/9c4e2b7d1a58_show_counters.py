@@ -0,0 +1,53 @@
+"""Show counters on Venue and Artist.
+
+Revision ID: 9c4e2b7d1a58
+Revises: 5d8a3c1f7e92
+Create Date: 2026-10-18 15:12:40.731902
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e2b7d1a58'
+down_revision = '5d8a3c1f7e92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    watermark = op.create_table(
+        'show_count_watermark',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rolled_over_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(),
+                                          nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(),
+                                          nullable=False, server_default='0'))
+
+    # Backfill around the same local time the application compares with.
+    now = datetime.now()
+    op.bulk_insert(watermark, [{'id': 1, 'rolled_over_at': now}])
+    for table, owner in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(sa.text(
+            f'UPDATE "{table}" SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM "Show" '
+            f'WHERE "Show".{owner} = "{table}".id AND "Show".start_time > :now), '
+            f'past_shows_count = (SELECT count(*) FROM "Show" '
+            f'WHERE "Show".{owner} = "{table}".id AND "Show".start_time <= :now)'
+        ).bindparams(now=now))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
+    op.drop_table('show_count_watermark')
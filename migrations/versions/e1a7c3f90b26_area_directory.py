@@ -0,0 +1,48 @@
+"""Area directory behind /venues.
+
+Revision ID: e1a7c3f90b26
+Revises: 9c4e2b7d1a58
+Create Date: 2026-10-18 16:40:03.118520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a7c3f90b26'
+down_revision = '9c4e2b7d1a58'
+branch_labels = None
+depends_on = None
+
+# Same as models.AREA_DIRECTORY_SELECT at this revision.
+AREA_DIRECTORY_SELECT = (
+    'SELECT id AS venue_id, city, state, name, upcoming_shows_count AS upcoming_count '
+    'FROM "Venue"'
+)
+
+
+def upgrade():
+    # A materialized view on Postgres, refreshed by areas.refresh(); a
+    # table kept current by the application elsewhere.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f'CREATE MATERIALIZED VIEW area_directory AS {AREA_DIRECTORY_SELECT}')
+    else:
+        op.create_table(
+            'area_directory',
+            sa.Column('venue_id', sa.Integer(), nullable=False),
+            sa.Column('city', sa.String(length=120), nullable=False),
+            sa.Column('state', sa.String(length=120), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('upcoming_count', sa.Integer(), nullable=False)
+        )
+        op.execute(f'INSERT INTO area_directory {AREA_DIRECTORY_SELECT}')
+    op.create_index('ix_area_directory_venue_id', 'area_directory', ['venue_id'], unique=True)
+    op.create_index('ix_area_directory_area', 'area_directory', ['city', 'state', 'name', 'venue_id'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP MATERIALIZED VIEW area_directory')
+    else:
+        op.drop_table('area_directory')
@@ -1,12 +1,59 @@
 from email.policy import default
 import imp
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import (DDL, Column, Index, Integer, MetaData, String, Table, bindparam,
+                        event, inspect, select, text)
+from sqlalchemy.orm import Session
 from datetime import datetime
 
 db = SQLAlchemy()
 
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def from_names(cls, names):
+        # Genre rows for the given names in one lookup, creating any that
+        # do not exist yet.
+        names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        if not names:
+            return []
+        existing = dict((genre.name, genre) for genre in
+                        cls.query.filter(cls.name.in_(names)).all())
+        return [existing.get(name) or cls(name=name) for name in names]
+
+    def __repr__(self):
+        return f"<Genre id={self.id} name={self.name}>"
+
+
+# Association tables. The (genre_id, owner id) indexes serve
+# "venues/artists playing <genre>" lookups.
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id'),
+)
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # pg_trgm index serving the case-insensitive name search
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -14,16 +61,27 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.Integer,nullable=False,)
-    genres = db.Column(db.String, nullable=False)
+    genres = db.relationship("Genre", secondary=venue_genres,
+                             order_by=Genre.name, lazy="select")
     image_link = db.Column(db.String(500))
+    # SHA-256 of the fetched image_link, naming its thumbnails (images.py);
+    # None until it has been fetched.
+    image_digest = db.Column(db.String(64))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
     created_at = db.Column(
         db.DateTime, default=datetime.utcnow, nullable=False)
-    shows = db.relationship("Show", backref="venues",
-                            lazy=False, cascade="all, delete-orphan")
+    # Version of the venue as the API shows it: moved on any change to the
+    # row, its genres or its shows (see the Versioning section below).
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, nullable=False)
+    # Shows after / up to the rollover watermark (see Show counters below).
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship("Show", back_populates="venue",
+                            lazy="select", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Venue id={self.id} name={self.name} city={self.city} state={self.city}> \n"
@@ -33,26 +91,43 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.Integer,nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship("Genre", secondary=artist_genres,
+                             order_by=Genre.name, lazy="select")
     image_link = db.Column(db.String(500))
+    image_digest = db.Column(db.String(64))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.String(), nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
     created_at = db.Column(
         db.DateTime, default=datetime.utcnow, nullable=False)
-    shows = db.relationship("Show", backref="artists",
-                            lazy=False, cascade="all, delete-orphan")
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, nullable=False)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship("Show", back_populates="artist",
+                            lazy="select", cascade="all, delete-orphan")
 
 
 class Show(db.Model):
     __tablename__ = "Show"
+    __table_args__ = (
+        # Detail pages read one venue's or artist's shows split around now;
+        # the listing pages the whole table in (start_time, id) order.
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
@@ -60,9 +135,249 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False,
                            default=datetime.utcnow)
-    venue = db.relationship('Venue') 
-    artist = db.relationship('Artist')
+    venue = db.relationship('Venue', back_populates="shows")
+    artist = db.relationship('Artist', back_populates="shows")
 
 
     def __repr__(self):
-        return f"<Show id={self.id} artist_id={self.artist_id} venue_id={self.venue_id} start_time={self.start_time}"
\ No newline at end of file
+        return f"<Show id={self.id} artist_id={self.artist_id} venue_id={self.venue_id} start_time={self.start_time}"
+
+
+class ShowCountWatermark(db.Model):
+    # Single row. Venue/Artist.upcoming_shows_count counts the shows
+    # starting after rolled_over_at, past_shows_count the others.
+    __tablename__ = 'show_count_watermark'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_over_at = db.Column(db.DateTime, nullable=False)
+
+
+@event.listens_for(ShowCountWatermark.__table__, 'after_create')
+def _insert_watermark(target, connection, **kw):
+    connection.execute(target.insert().values(id=1, rolled_over_at=datetime.now()))
+
+
+#----------------------------------------------------------------------------#
+# Area directory.
+#----------------------------------------------------------------------------#
+
+# What /venues lists, one row per venue, indexed in page order so a page is
+# a single index-ordered scan. On Postgres it is a materialized view,
+# refreshed concurrently by areas.refresh(); elsewhere a table kept current
+# in the writing transaction by sync_areas(). It is created alongside the
+# other tables (see the DDL events below) but lives outside db.metadata,
+# since it is not a plain table everywhere.
+
+area_directory = Table(
+    'area_directory', MetaData(),
+    Column('venue_id', Integer, nullable=False),
+    Column('city', String(120), nullable=False),
+    Column('state', String(120), nullable=False),
+    Column('name', String, nullable=False),
+    Column('upcoming_count', Integer, nullable=False),
+    # REFRESH ... CONCURRENTLY needs a unique index.
+    Index('ix_area_directory_venue_id', 'venue_id', unique=True),
+    Index('ix_area_directory_area', 'city', 'state', 'name', 'venue_id'),
+)
+
+AREA_DIRECTORY_SELECT = (
+    'SELECT id AS venue_id, city, state, name, upcoming_shows_count AS upcoming_count '
+    'FROM "Venue"'
+)
+
+AREA_SYNC_CHUNK = 500
+
+
+def areas_materialized(connection):
+    return connection.dialect.name == 'postgresql'
+
+
+def sync_areas(connection, venue_ids):
+    # Rewrites the directory rows of the given venues (a deleted venue's
+    # row is removed). The materialized view is left to areas.refresh().
+    if areas_materialized(connection):
+        return
+    ids = sorted(set(id for id in venue_ids if id is not None))
+    for start in range(0, len(ids), AREA_SYNC_CHUNK):
+        chunk = ids[start:start + AREA_SYNC_CHUNK]
+        connection.execute(area_directory.delete().where(area_directory.c.venue_id.in_(chunk)))
+        connection.execute(text(
+            f'INSERT INTO area_directory {AREA_DIRECTORY_SELECT} WHERE id IN :ids'
+        ).bindparams(bindparam('ids', expanding=True)), {'ids': chunk})
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_area_directory(target, connection, **kw):
+    # create_all() runs this on every call, not only when tables were made.
+    if inspect(connection).has_table(area_directory.name):
+        return
+    if areas_materialized(connection):
+        connection.execute(text(f'CREATE MATERIALIZED VIEW area_directory AS {AREA_DIRECTORY_SELECT}'))
+        for index in area_directory.indexes:
+            index.create(connection)
+    else:
+        area_directory.create(connection)
+        connection.execute(text(f'INSERT INTO area_directory {AREA_DIRECTORY_SELECT}'))
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_area_directory(target, connection, **kw):
+    kind = 'MATERIALIZED VIEW' if areas_materialized(connection) else 'TABLE'
+    connection.execute(text(f'DROP {kind} IF EXISTS area_directory'))
+
+
+# The trigram indexes need the pg_trgm extension before the tables exist.
+event.listen(db.metadata, 'before_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+
+#----------------------------------------------------------------------------#
+# Versioning.
+#----------------------------------------------------------------------------#
+
+# Venue.updated_at and Artist.updated_at move whenever anything their API
+# representation includes changes: their own columns and genres (stamped
+# before the flush), their shows (touched from the Show mapper events at
+# the end of this file) and the name or image of the artists (venues)
+# their shows list, which touch the other side when they change.
+
+TOUCH_CHUNK = 500
+
+
+def touch(connection, model, ids):
+    # Moves updated_at of the given rows without loading them.
+    ids = sorted(set(id for id in ids if id is not None))
+    now = datetime.utcnow()
+    table = model.__table__
+    for start in range(0, len(ids), TOUCH_CHUNK):
+        connection.execute(table.update().where(
+            table.c.id.in_(ids[start:start + TOUCH_CHUNK])).values(updated_at=now))
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_modified(session, flush_context, instances):
+    now = datetime.utcnow()
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and session.is_modified(obj):
+            obj.updated_at = now
+
+
+# Columns of a venue or artist that the other side's show entries carry.
+SHOWN_COLUMNS = ('name', 'image_link', 'image_digest')
+
+
+def _touch_counterparts(model, owner_key, other, other_key):
+    def listener(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in SHOWN_COLUMNS):
+            table = other.__table__
+            connection.execute(table.update().where(table.c.id.in_(
+                select(other_key).where(owner_key == target.id))).values(updated_at=datetime.utcnow()))
+    event.listen(model, 'after_update', listener)
+
+
+_touch_counterparts(Venue, Show.venue_id, Artist, Show.artist_id)
+_touch_counterparts(Artist, Show.artist_id, Venue, Show.venue_id)
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# upcoming_shows_count / past_shows_count split each venue's and artist's
+# shows around the watermark rather than the current time, so they only
+# change when shows are written (in the same transaction, below) or when
+# show_counts.roll_over() moves the watermark forward and the shows that
+# started in between from upcoming to past. Readers subtract the shows
+# that started since the watermark (queries.with_upcoming_count).
+#
+# Writers read the watermark under a shared lock on Postgres so a rollover
+# cannot commit between that read and their own commit.
+
+
+def watermark(connection, for_update=False):
+    query = select(ShowCountWatermark.rolled_over_at)
+    return connection.execute(query.with_for_update(read=not for_update)).scalar_one()
+
+
+def count_shows(connection, shows, sign=1):
+    # Adds (sign=1) or removes (sign=-1) (venue_id, artist_id, start_time)
+    # shows from their owners' counters, one statement per table.
+    if not shows:
+        return
+    boundary = watermark(connection)
+    for model, position in ((Venue, 0), (Artist, 1)):
+        deltas = {}
+        for show in shows:
+            delta = deltas.setdefault(show[position], [0, 0])
+            delta[0 if show[2] > boundary else 1] += sign
+        add_counts(connection, model, [(id, upcoming, past) for id, (upcoming, past) in deltas.items()])
+
+
+def add_counts(connection, model, deltas):
+    # deltas: [(id, upcoming delta, past delta)], as one executemany. The
+    # area directory carries the venue counters, so it follows.
+    if not deltas:
+        return
+    table = model.__table__
+    connection.execute(
+        table.update().where(table.c.id == bindparam('owner_id')).values(
+            upcoming_shows_count=table.c.upcoming_shows_count + bindparam('upcoming'),
+            past_shows_count=table.c.past_shows_count + bindparam('past')),
+        [{'owner_id': id, 'upcoming': upcoming, 'past': past} for id, upcoming, past in deltas])
+    if model is Venue:
+        sync_areas(connection, [id for id, upcoming, past in deltas])
+
+
+#----------------------------------------------------------------------------#
+# Show events.
+#----------------------------------------------------------------------------#
+
+# Shows are (venue_id, artist_id, start_time) tuples here. Code writing
+# shows without the ORM calls shows_written() itself, in the same
+# transaction.
+
+SHOW_KEY = ('venue_id', 'artist_id', 'start_time')
+
+
+def _stored_show(connection, target):
+    # The row as the database has it, whatever the session has loaded.
+    table = Show.__table__
+    return tuple(connection.execute(
+        select(*[table.c[name] for name in SHOW_KEY]).where(table.c.id == target.id)).one())
+
+
+def _current_show(target):
+    return tuple(getattr(target, name) for name in SHOW_KEY)
+
+
+def shows_written(connection, added, removed=()):
+    added, removed = list(added), list(removed)
+    count_shows(connection, added)
+    count_shows(connection, removed, -1)
+    touch(connection, Venue, [show[0] for show in added + removed])
+    touch(connection, Artist, [show[1] for show in added + removed])
+
+
+@event.listens_for(Show, 'after_insert')
+def _show_inserted(mapper, connection, target):
+    shows_written(connection, [_current_show(target)], [])
+
+
+@event.listens_for(Show, 'before_update')
+def _show_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in SHOW_KEY):
+        shows_written(connection, [_current_show(target)], [_stored_show(connection, target)])
+
+
+@event.listens_for(Show, 'before_delete')
+def _show_deleted(mapper, connection, target):
+    shows_written(connection, [], [_stored_show(connection, target)])
+
+
+@event.listens_for(Venue, 'after_insert')
+@event.listens_for(Venue, 'after_update')
+@event.listens_for(Venue, 'after_delete')
+def _venue_written(mapper, connection, target):
+    sync_areas(connection, [target.id])
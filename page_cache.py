@@ -0,0 +1,284 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import g, request, session as flask_session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import Artist, Venue, Show
+import jobs
+
+#----------------------------------------------------------------------------#
+# Rendered page cache.
+#----------------------------------------------------------------------------#
+
+# Venue and artist pages only change when a venue, artist or show is
+# written, so their rendered HTML is cached under the entity's key
+# ("venue:<id>", "artist:<id>"). Writes stage the keys they affect on the
+# SQLAlchemy session and the entries are dropped once it commits. Pages of
+# the venue directory live in the "venues" group, which any venue or show
+# write invalidates as a whole by moving the group to a new generation.
+#
+# These pages also change without any write: a show moves from upcoming to
+# past when its start_time passes. Views report the next start_time their
+# page depends on through expire_at(), and the entry's TTL is cut so that
+# it expires exactly then.
+#
+# Backends: "memory" is a per-process LRU, fine for a single worker.
+# "redis" shares entries (and invalidations) across workers and accepts any
+# client with the redis-py get/set/delete interface. Invalidating a shared
+# backend costs round trips, so it runs as a background job (jobs.py);
+# the in-process LRU is invalidated inline.
+
+
+class LRUBackend(object):
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend(object):
+
+    def __init__(self, client, prefix='fyyur:page:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+        else:
+            self.client.set(self.prefix + key, value)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+class PageCache(object):
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('PAGE_CACHE_BACKEND')
+        self.ttl = app.config['PAGE_CACHE_TTL']
+        if kind == 'memory':
+            self.backend = LRUBackend(app.config['PAGE_CACHE_MAX_ENTRIES'])
+        elif kind == 'redis':
+            # Optional dependency, only needed for the shared backend.
+            import redis
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['PAGE_CACHE_REDIS_URL']))
+        else:
+            self.backend = None
+        app.extensions['page_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def expire_at(self, when):
+        # Called while rendering: the page being built stops being valid at
+        # `when` (a naive local datetime, like the start_time comparisons).
+        if when is None:
+            return
+        current = g.get('page_cache_expires_at')
+        if current is None or when < current:
+            g.page_cache_expires_at = when
+
+    def _ttl(self):
+        expires_at = g.pop('page_cache_expires_at', None)
+        if expires_at is None:
+            return self.ttl
+        remaining = (expires_at - datetime.now()).total_seconds()
+        return min(remaining, self.ttl) if self.ttl else remaining
+
+    def get_or_render(self, key, render):
+        # Pages carrying a flashed message are rendered fresh and not stored,
+        # so a message is neither cached nor swallowed.
+        if not self.enabled or '_flashes' in flask_session:
+            return render()
+
+        body = self.backend.get(key)
+        g.page_cache_hit = body is not None
+        if body is not None:
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        g.pop('page_cache_expires_at', None)
+        body = render()
+        ttl = self._ttl()
+        if isinstance(body, str) and (ttl is None or ttl > 0):
+            self.backend.set(key, body, ttl)
+        return body
+
+    def _generation(self, group):
+        # A missing (or evicted) generation starts a new one, so entries of
+        # an older generation can never be served again.
+        marker = f'{group}:generation'
+        generation = self.backend.get(marker)
+        if generation is None:
+            generation = self._new_generation(group)
+        return generation
+
+    def _new_generation(self, group):
+        generation = f'{time.time_ns():x}'
+        self.backend.set(f'{group}:generation', generation)
+        return generation
+
+    def cached(self, key_pattern, group=None):
+        # View decorator; key_pattern is formatted with the view arguments
+        # and the raw query string, e.g. @cache.cached('venue:{venue_id}').
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                key = key_pattern.format(query=request.query_string.decode('latin-1'), **kwargs)
+                if group is not None and self.enabled:
+                    key = f'{group}:{self._generation(group)}:{key}'
+                return self.get_or_render(key, lambda: view(**kwargs))
+            return wrapper
+        return decorator
+
+    @property
+    def shared(self):
+        return isinstance(self.backend, RedisBackend)
+
+    def invalidate(self, *keys):
+        if not self.enabled:
+            return
+        for group in [key[len('group:'):] for key in keys if key.startswith('group:')]:
+            self._new_generation(group)
+        keys = [key for key in keys if not key.startswith('group:')]
+        if keys:
+            self.backend.delete(*keys)
+
+
+cache = PageCache()
+
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+PENDING_KEY = 'page_cache_pending'
+
+# Columns of one side that the other side's page renders next to a show.
+SHOWN_ON_OTHER_PAGES = ('name', 'image_link', 'image_digest')
+
+
+def _changed(obj, names):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _previous(obj, name):
+    history = inspect(obj).attrs[name].history
+    return list(history.deleted) + list(history.unchanged) + list(history.added)
+
+
+def affected_keys(session):
+    keys = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Venue):
+            keys.add(f'venue:{obj.id}')
+            keys.add('group:venues')
+            if obj in session.dirty and _changed(obj, SHOWN_ON_OTHER_PAGES):
+                keys.update(f'artist:{id}' for id in session.execute(
+                    select(Show.artist_id).where(Show.venue_id == obj.id).distinct()
+                ).scalars())
+        elif isinstance(obj, Artist):
+            keys.add(f'artist:{obj.id}')
+            if obj in session.dirty and _changed(obj, SHOWN_ON_OTHER_PAGES):
+                keys.update(f'venue:{id}' for id in session.execute(
+                    select(Show.venue_id).where(Show.artist_id == obj.id).distinct()
+                ).scalars())
+        elif isinstance(obj, Show):
+            # A moved show dirties both the old and the new owner's page.
+            keys.add('group:venues')
+            keys.update(f'venue:{id}' for id in _previous(obj, 'venue_id') if id is not None)
+            keys.update(f'artist:{id}' for id in _previous(obj, 'artist_id') if id is not None)
+    return keys
+
+
+@event.listens_for(Session, 'after_flush')
+def _stage(session, flush_context):
+    if cache.enabled:
+        session.info.setdefault(PENDING_KEY, set()).update(affected_keys(session))
+
+
+@jobs.task('page_cache.invalidate')
+def invalidate_keys(keys):
+    cache.invalidate(*keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate(session):
+    keys = session.info.pop(PENDING_KEY, None)
+    if not keys:
+        return
+    if cache.shared:
+        jobs.enqueue('page_cache.invalidate', sorted(keys))
+    else:
+        cache.invalidate(*keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,157 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from flask import abort, current_app, request
+from sqlalchemy import and_, or_
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# Listings are paged on a unique, ordered key such as (name, id) or
+# (start_time, id). Each page continues from the key of the last (or first)
+# row of the previous one, so fetching page N costs the same as page 1
+# instead of scanning N * per_page rows like OFFSET would.
+
+PageRequest = namedtuple('PageRequest', ['after', 'before', 'per_page'])
+
+
+class Page(object):
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    # Datetimes are tagged so they come back as datetimes, not strings.
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v
+               for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _cursor_value(value):
+    if isinstance(value, dict) and list(value) == ['dt'] and isinstance(value['dt'], str):
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    raise ValueError(f'not a cursor key value: {value!r}')
+
+
+def decode_cursor(cursor):
+    # Raises ValueError for anything encode_cursor could not have written.
+    padded = cursor + '=' * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    if not isinstance(payload, list):
+        raise ValueError('cursor must encode a list of key values')
+    return [_cursor_value(v) for v in payload]
+
+
+def page_request(source=None):
+    # Reads after/before/per_page from the query string or form, clamping
+    # per_page to MAX_PAGE_SIZE. Malformed cursors are a client error.
+    if source is None:
+        source = request.values
+
+    default_size = current_app.config['PAGE_SIZE']
+    max_size = current_app.config['MAX_PAGE_SIZE']
+    try:
+        per_page = int(source.get('per_page', default_size))
+    except (TypeError, ValueError):
+        per_page = default_size
+    per_page = max(1, min(per_page, max_size))
+
+    try:
+        after = source.get('after')
+        before = source.get('before')
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+    except (ValueError, TypeError, KeyError):
+        abort(400)
+
+    return PageRequest(after, before, per_page)
+
+
+def _seek(keys, values, forward):
+    # (k1, k2, ...) > (v1, v2, ...) spelled out as
+    # k1 > v1 OR (k1 = v1 AND k2 > v2) OR ..., which every backend can use
+    # against an index on the same columns.
+    clauses = []
+    for i, key in enumerate(keys):
+        bound = key > values[i] if forward else key < values[i]
+        equal = [keys[j] == values[j] for j in range(i)]
+        clauses.append(and_(*(equal + [bound])))
+    return or_(*clauses)
+
+
+def _fits(keys, values):
+    # One value per key, of the key column's type (ints pass for floats).
+    if len(values) != len(keys):
+        return False
+    for key, value in zip(keys, values):
+        try:
+            expected = key.type.python_type
+        except NotImplementedError:
+            continue
+        if expected is float:
+            expected = (int, float)
+        if not isinstance(value, expected):
+            return False
+    return True
+
+
+def _key_of(item, keys):
+    return [getattr(item, key.key) for key in keys]
+
+
+def paginate(query, keys, page):
+    # `query` must be unordered; the keys define the order. Rows (ORM
+    # objects or tuples) must expose every key column as an attribute.
+    keys = list(keys)
+    backward = page.before is not None and page.after is None
+    cursor = page.before if backward else page.after
+
+    if cursor is not None:
+        if not _fits(keys, cursor):
+            abort(400)
+        query = query.filter(_seek(keys, cursor, forward=not backward))
+
+    if backward:
+        query = query.order_by(*[key.desc() for key in keys])
+    else:
+        query = query.order_by(*keys)
+
+    rows = query.limit(page.per_page + 1).all()
+    has_more = len(rows) > page.per_page
+    items = rows[:page.per_page]
+
+    if backward:
+        items.reverse()
+        next_cursor = encode_cursor(_key_of(items[-1], keys)) if items else None
+        prev_cursor = encode_cursor(_key_of(items[0], keys)) if has_more else None
+    else:
+        next_cursor = encode_cursor(_key_of(items[-1], keys)) if has_more else None
+        prev_cursor = None
+        if page.after is not None and items:
+            prev_cursor = encode_cursor(_key_of(items[0], keys))
+
+    return Page(items, page.per_page, next_cursor, prev_cursor)
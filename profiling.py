@@ -0,0 +1,153 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL profiling.
+#----------------------------------------------------------------------------#
+
+# Every statement executed while a request is being handled is timed from
+# the cursor events and counted under its normalized shape (literals and
+# placeholders replaced by "?", IN lists collapsed), so the same query run
+# for each row of a listing is recognised as one shape. A shape executed
+# more than SQL_N_PLUS_ONE_THRESHOLD times in one request is reported as a
+# likely N+1.
+#
+# Each response carries a Server-Timing header (db and app time) and one
+# JSON log line on the app logger with the endpoint, status, timings,
+# statement count and any N+1 shapes.
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|(?<!:):\w+|\$\d+|%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize(statement):
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestProfile(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.statements += 1
+        self.db_time += duration
+        self.shapes[normalize(statement)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count > threshold]
+
+
+def current_profile():
+    if has_request_context():
+        return g.get('sql_profile')
+    return None
+
+
+# The start time rides on the statement's execution context rather than
+# the pooled connection, so a statement that fails (and never reaches
+# after_cursor_execute) leaves nothing behind to pair with a later one.
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_profile() is not None:
+        context.profile_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'profile_started', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    profile = current_profile()
+    if profile is not None:
+        profile.record(statement, duration)
+
+
+def _start():
+    g.sql_profile = RequestProfile()
+
+
+def _finish(response):
+    profile = g.get('sql_profile')
+    if profile is None:
+        return response
+
+    total = time.perf_counter() - profile.started
+    response.headers.add('Server-Timing', 'db;dur=%.2f;desc="%d queries"' % (
+        profile.db_time * 1000, profile.statements))
+    response.headers.add('Server-Timing', 'app;dur=%.2f' % (total * 1000))
+
+    repeated = profile.repeated(current_app.config['SQL_N_PLUS_ONE_THRESHOLD'])
+    record = {
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 2),
+        'db_ms': round(profile.db_time * 1000, 2),
+        'queries': profile.statements,
+    }
+    if repeated:
+        record['n_plus_one'] = [{'sql': shape, 'count': count} for shape, count in repeated]
+        current_app.logger.warning(json.dumps(record))
+    else:
+        current_app.logger.info(json.dumps(record))
+    return response
+
+
+def init_app(app):
+    if not app.config['SQL_PROFILING']:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+
+
+#----------------------------------------------------------------------------#
+# Structured logs.
+#----------------------------------------------------------------------------#
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line. Messages that are already JSON objects (the
+    # request lines above) are merged in rather than nested as a string.
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        message = record.getMessage()
+        try:
+            fields = json.loads(message)
+        except ValueError:
+            fields = None
+        if isinstance(fields, dict):
+            entry.update(fields)
+        else:
+            entry['message'] = message
+            entry['where'] = f'{record.pathname}:{record.lineno}'
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
@@ -0,0 +1,172 @@
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, selectinload
+
+from models import db, area_directory, Artist, Venue, Show, ShowCountWatermark
+from pagination import paginate
+
+#----------------------------------------------------------------------------#
+# Loading profiles.
+#----------------------------------------------------------------------------#
+
+# Venue.shows and Artist.shows load lazily by default; each view picks the
+# profile matching what its template actually reads.
+
+# Listings only render ids and names. (The venue listing reads the area
+# directory instead of Venue.)
+ARTIST_LIST = (load_only(Artist.id, Artist.name),)
+
+# Detail pages load the entity and its genres; their shows come
+# pre-partitioned from venue_shows() / artist_shows() below.
+VENUE_DETAIL = (selectinload(Venue.genres),)
+ARTIST_DETAIL = (selectinload(Artist.genres),)
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+
+# Keyset orderings. Venues are paged in area order so that each page's
+# areas stay contiguous; the area directory has an index in that order.
+AREA_KEYS = (area_directory.c.city, area_directory.c.state,
+             area_directory.c.name, area_directory.c.venue_id)
+VENUE_KEYS = (Venue.name, Venue.id)
+ARTIST_KEYS = (Artist.name, Artist.id)
+SHOW_KEYS = (Show.start_time, Show.id)
+
+
+def with_upcoming_count(query, owner_id, stored_count, owner_key, now):
+    # Adds num_upcoming_shows from a stored counter: shows after the
+    # rollover watermark, less those that have started since (a short
+    # start_time range on the Show(start_time, id) index).
+    boundary = select(ShowCountWatermark.rolled_over_at).scalar_subquery()
+    started = db.session.query(
+        owner_key.label('owner_id'),
+        db.func.count(Show.id).label('started')
+    ).filter(Show.start_time > boundary, Show.start_time <= now).group_by(owner_key).subquery()
+    return query.add_columns(
+        (stored_count - db.func.coalesce(started.c.started, 0)).label('num_upcoming_shows')
+    ).outerjoin(started, started.c.owner_id == owner_id)
+
+
+def venue_areas(page, now=None):
+    # Builds one page of the area -> venues -> upcoming show count tree used
+    # by /venues from an index-ordered scan of the area directory. Returns
+    # the areas, the Page and the earliest upcoming start_time on the page
+    # (when its counts change).
+    if now is None:
+        now = datetime.now()
+
+    directory = area_directory.c
+    next_start_time = select(db.func.min(Show.start_time)).where(
+        Show.venue_id == directory.venue_id, Show.start_time > now
+    ).scalar_subquery().label('next_start_time')
+    query = with_upcoming_count(
+        db.session.query(directory.city, directory.state, directory.venue_id, directory.name,
+                         next_start_time),
+        directory.venue_id, directory.upcoming_count, Show.venue_id, now)
+    result = paginate(query, AREA_KEYS, page)
+
+    areas = []
+    for (city, state), venues in groupby(result.items, key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.venue_id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues]
+        })
+
+    starts = [row.next_start_time for row in result.items if row.next_start_time is not None]
+    return areas, result, min(starts) if starts else None
+
+
+def venue_search(condition, page, now=None):
+    # One page of (id, name, num_upcoming_shows) for the venues matching
+    # `condition`.
+    query = with_upcoming_count(
+        db.session.query(Venue.id, Venue.name).filter(condition),
+        Venue.id, Venue.upcoming_shows_count, Show.venue_id, now or datetime.now())
+    return paginate(query, VENUE_KEYS, page)
+
+
+#----------------------------------------------------------------------------#
+# Detail page shows.
+#----------------------------------------------------------------------------#
+
+
+def _partitioned_shows(owner_key, columns, joins, owner_id, now, limit):
+    # Past and upcoming slices for one venue or artist, split around `now`
+    # in SQL: an aggregate for the exact counts plus two limited, ordered
+    # projections (soonest upcoming first, most recent past first). Served
+    # by the Show(<owner>_id, start_time) indexes.
+    upcoming = Show.start_time > now
+    counts = db.session.query(
+        db.func.count(Show.id).filter(upcoming),
+        db.func.count(Show.id).filter(Show.start_time <= now)
+    ).filter(owner_key == owner_id).one()
+
+    def slice_of(condition, order):
+        query = db.session.query(*columns).select_from(Show)
+        for target, on in joins:
+            query = query.join(target, on)
+        return query.filter(owner_key == owner_id, condition).order_by(
+            order, Show.id).limit(limit).all()
+
+    return {
+        "upcoming_shows": slice_of(upcoming, Show.start_time.asc()),
+        "upcoming_shows_count": counts[0],
+        "past_shows": slice_of(Show.start_time <= now, Show.start_time.desc()),
+        "past_shows_count": counts[1],
+    }
+
+
+def venue_shows(venue_id, limit, now=None):
+    return _partitioned_shows(
+        Show.venue_id,
+        (Show.artist_id,
+         Artist.name.label('artist_name'),
+         Artist.image_link.label('artist_image_link'),
+         Artist.image_digest.label('artist_image_digest'),
+         Show.start_time),
+        [(Artist, Show.artist_id == Artist.id)],
+        venue_id, now or datetime.now(), limit)
+
+
+def artist_shows(artist_id, limit, now=None):
+    return _partitioned_shows(
+        Show.artist_id,
+        (Show.venue_id,
+         Venue.name.label('venue_name'),
+         Venue.image_link.label('venue_image_link'),
+         Venue.image_digest.label('venue_image_digest'),
+         Show.start_time),
+        [(Venue, Show.venue_id == Venue.id)],
+        artist_id, now or datetime.now(), limit)
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+
+def show_listing(page):
+    # Projects only the columns /shows renders from one Show/Artist/Venue
+    # join, so rows come back as lightweight tuples rather than ORM objects.
+    query = db.session.query(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Artist.image_digest.label('artist_image_digest'),
+        Show.start_time
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id
+    )
+    return paginate(query, SHOW_KEYS, page)
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from bulk import insert_rows
+from models import db, shows_written, Artist, Venue, Show
+from page_cache import cache
+import areas
+
+#----------------------------------------------------------------------------#
+# Batch show scheduling.
+#----------------------------------------------------------------------------#
+
+# A tour is a list of {"artist_id", "venue_id", "start_time"} items. Every
+# item is checked first: ids must be integers of existing rows (one IN
+# query per table for the whole batch) and start_time an ISO 8601 local
+# date and time without a UTC offset, like every stored start time. The
+# valid items are then inserted in one transaction (bulk.insert_rows) and
+# their results carry the new show ids. By default a batch is all or
+# nothing; with partial=True the valid items are inserted even when others
+# are rejected.
+#
+# The rows are written without the ORM, so the owners' show counters and
+# updated_at are maintained here (models.shows_written) and the pages they
+# change are invalidated once the transaction commits.
+
+
+def existing_ids(model, ids):
+    ids = set(ids)
+    if not ids:
+        return set()
+    return set(db.session.execute(select(model.id).where(model.id.in_(ids))).scalars())
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, str):
+        value = value.strip()
+    return int(value)
+
+
+def parse(item):
+    # (row, errors) for one submitted item; row is None when invalid.
+    if not isinstance(item, dict):
+        return None, {'item': ['Must be an object.']}
+
+    errors = {}
+    row = {}
+    for field in ('artist_id', 'venue_id'):
+        try:
+            row[field] = _integer(item.get(field))
+        except (TypeError, ValueError):
+            errors[field] = ['Must be an integer id.']
+    try:
+        row['start_time'] = datetime.fromisoformat(str(item.get('start_time')))
+    except (TypeError, ValueError):
+        errors['start_time'] = ['Must be a date and time, e.g. 2027-01-31T20:00:00.']
+    else:
+        # Stored start times are naive local times; they cannot be compared
+        # with an aware one.
+        if row['start_time'].tzinfo is not None:
+            errors['start_time'] = ['Must be a local date and time, without a UTC offset.']
+    return (None if errors else row), errors
+
+
+def schedule(items, partial=False):
+    # Returns (results, created): one result per item, in order, and the
+    # number of shows inserted.
+    parsed = [parse(item) for item in items]
+    artists = existing_ids(Artist, [row['artist_id'] for row, errors in parsed if row])
+    venues = existing_ids(Venue, [row['venue_id'] for row, errors in parsed if row])
+
+    results, rows = [], []
+    for index, (row, errors) in enumerate(parsed):
+        if row is not None:
+            if row['artist_id'] not in artists:
+                errors['artist_id'] = ['No artist with this id.']
+            if row['venue_id'] not in venues:
+                errors['venue_id'] = ['No venue with this id.']
+        if errors:
+            results.append({'index': index, 'status': 'rejected', 'errors': errors})
+        else:
+            results.append({'index': index, 'status': 'created'})
+            rows.append(row)
+
+    if len(rows) < len(parsed) and not partial:
+        for result in results:
+            if result['status'] == 'created':
+                result['status'] = 'not_created'
+        return results, 0
+
+    if rows:
+        ids = iter(insert_rows(Show.__table__, rows))
+        for result in results:
+            if result['status'] == 'created':
+                result['id'] = next(ids)
+        shows_written(db.session.connection(),
+                      [(row['venue_id'], row['artist_id'], row['start_time']) for row in rows])
+        areas.stale()
+        db.session.commit()
+        keys = set(['group:venues'])
+        for row in rows:
+            keys.add(f"venue:{row['venue_id']}")
+            keys.add(f"artist:{row['artist_id']}")
+        cache.invalidate(*keys)
+    return results, len(rows)
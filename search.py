@@ -0,0 +1,181 @@
+from flask import current_app
+from sqlalchemy import case, event, func, literal, select, text, union_all
+
+from models import db, Artist, Venue
+import search_index
+
+#----------------------------------------------------------------------------#
+# Name search.
+#----------------------------------------------------------------------------#
+
+# Case-insensitive substring search over venue and artist names.
+#
+# On Postgres the ILIKE predicates are served by the pg_trgm GIN indexes
+# declared on Venue.name and Artist.name, and results are ranked with
+# similarity(). On SQLite (local development and tests) names are mirrored
+# into FTS5 trigram tables kept current by triggers; terms shorter than a
+# trigram fall back to LIKE, which SQLite already treats case-insensitively.
+#
+# With SEARCH_BACKEND = 'memory' the matching ids come from the in-process
+# inverted index in search_index.py instead, bound into the query as an IN
+# list. Empty and short terms, and terms matching more than MAX_BOUND_IDS
+# rows, still use the database predicates: their id lists would be whole
+# posting lists, over SQLite's bound parameter limit and slower to bind
+# than to match.
+
+SEARCHABLE = {
+    'venue': Venue,
+    'artist': Artist,
+}
+
+FTS_TABLES = {
+    Venue: 'venue_fts',
+    Artist: 'artist_fts',
+}
+
+_fts_ready = {}
+
+MAX_BOUND_IDS = 500
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _in_memory():
+    return current_app.config.get('SEARCH_BACKEND') == 'memory'
+
+
+def _kind(model):
+    return 'venue' if model is Venue else 'artist'
+
+
+def _has_fts(model):
+    url = str(db.engine.url)
+    if url not in _fts_ready:
+        names = db.session.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('venue_fts', 'artist_fts')"
+        )).scalars().all()
+        _fts_ready[url] = set(names)
+    return FTS_TABLES[model] in _fts_ready[url]
+
+
+def _fts_query(term):
+    # A quoted FTS5 string matches the term as a literal substring.
+    return '"' + term.replace('"', '""') + '"'
+
+
+def matches(model, term, prefix=False):
+    # WHERE clause selecting rows of `model` whose name contains `term`
+    # (or starts with it when prefix=True).
+    if prefix:
+        return model.name.ilike(f'{term}%')
+
+    if _in_memory() and len(term) >= search_index.GRAM_SIZE:
+        ids = search_index.lookup(_kind(model), term)
+        if len(ids) <= MAX_BOUND_IDS:
+            return model.id.in_(sorted(ids))
+
+    if _dialect() == 'sqlite' and len(term) >= 3 and _has_fts(model):
+        table = FTS_TABLES[model]
+        return model.id.in_(
+            select(text('rowid')).select_from(text(table)).where(
+                text(f'{table} MATCH :fts_term').bindparams(fts_term=_fts_query(term))
+            )
+        )
+
+    return model.name.ilike(f'%{term}%')
+
+
+def rank(model, term):
+    # Ordering for ranked results: prefix matches first, then the closest
+    # names. Lower sorts first.
+    starts = case((model.name.ilike(f'{term}%'), 0), else_=1)
+    if _dialect() == 'postgresql':
+        closeness = 1 - func.similarity(model.name, term)
+    else:
+        closeness = func.instr(func.lower(model.name), term.lower())
+    return starts, closeness
+
+
+def counts(term, kinds=None):
+    # Number of matching rows per kind, in one round trip.
+    kinds = kinds or SEARCHABLE.keys()
+    if _in_memory():
+        return dict((kind, len(search_index.lookup(kind, term))) for kind in kinds)
+
+    columns = []
+    for kind in kinds:
+        model = SEARCHABLE[kind]
+        columns.append(
+            select(func.count(model.id)).where(matches(model, term))
+            .scalar_subquery().label(kind)
+        )
+    row = db.session.execute(select(*columns)).one()
+    return dict(row._mapping)
+
+
+def search(term, kinds=None, limit=20, prefix=False):
+    # Ranked search across several entity types in one round trip. Returns
+    # {kind: {"count": total matches, "data": [rows of (id, name)]}} with at
+    # most `limit` best-ranked rows per kind.
+    kinds = list(kinds or SEARCHABLE.keys())
+    selects = []
+    for kind in kinds:
+        model = SEARCHABLE[kind]
+        starts, closeness = rank(model, term)
+        selects.append(
+            select(
+                literal(kind).label('kind'),
+                model.id.label('id'),
+                model.name.label('name'),
+                func.count().over().label('total'),
+                func.row_number().over(
+                    order_by=(starts, closeness, model.name, model.id)
+                ).label('position')
+            ).where(matches(model, term, prefix=prefix))
+        )
+
+    ranked = union_all(*selects).subquery()
+    rows = db.session.execute(
+        select(ranked).where(ranked.c.position <= limit)
+        .order_by(ranked.c.kind, ranked.c.position)
+    ).all()
+
+    results = dict((kind, {"count": 0, "data": []}) for kind in kinds)
+    for row in rows:
+        results[row.kind]["count"] = row.total
+        results[row.kind]["data"].append(row)
+    return results
+
+
+#----------------------------------------------------------------------------#
+# SQLite FTS5 mirror.
+#----------------------------------------------------------------------------#
+
+# The same DDL ships in the search migration; it is repeated here so that
+# db.create_all() on SQLite (tests, local runs) gets the tables too.
+
+def sqlite_fts_ddl(table, fts):
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+        f"INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_sqlite_fts(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    for model, fts in FTS_TABLES.items():
+        for statement in sqlite_fts_ddl(model.__tablename__, fts):
+            connection.execute(text(statement))
+    _fts_ready.pop(str(connection.engine.url), None)
@@ -0,0 +1,271 @@
+import threading
+from collections import defaultdict
+
+from flask import g, has_request_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Artist, Venue, Genre
+import jobs
+
+#----------------------------------------------------------------------------#
+# In-process inverted index.
+#----------------------------------------------------------------------------#
+
+# An n-gram index over venue and artist names, cities and genres, used by
+# search.matches() when SEARCH_BACKEND = 'memory'. Every 1-, 2- and 3-gram
+# of a lower-cased value maps to the ids containing it. A term of up to
+# three characters is itself a posting key; longer terms intersect the
+# postings of their trigrams and then confirm the substring, so results are
+# exactly those of ILIKE '%term%' (terms are matched literally, so LIKE
+# wildcards in a term are not special).
+#
+# The index is loaded from the database on first use and then kept current
+# from mapper events. The changed ids are staged on the session and, once
+# it commits, a background job (jobs.py) re-reads those rows and updates
+# the index, so rolled back writes never reach it and jobs finishing out of
+# order still leave the latest committed values.
+#
+# Writes this process never sees (other workers, `flask fyyur import`)
+# are caught up before answering: once per request, one query reads each
+# table's row count and latest updated_at. When they moved, the rows
+# updated since are re-read and, if the count still differs, deleted ids
+# are dropped. A transaction that commits after a later one with an
+# older updated_at can still be missed until its rows change again.
+
+MODELS = {
+    'venue': Venue,
+    'artist': Artist,
+}
+
+FIELDS = ('name', 'city', 'genres')
+
+GRAM_SIZE = 3
+
+
+def _values(field, value):
+    if value is None:
+        return []
+    if field == 'genres':
+        return [getattr(genre, 'name', genre).lower() for genre in value]
+    return [value.lower()]
+
+
+def _grams(text):
+    grams = set()
+    for size in range(1, GRAM_SIZE + 1):
+        for i in range(len(text) - size + 1):
+            grams.add(text[i:i + size])
+    return grams
+
+
+class InvertedIndex(object):
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.docs = dict((kind, {}) for kind in MODELS)
+        self.postings = defaultdict(set)
+        # _signature() of the database rows the index reflects.
+        self.signature = None
+
+    def add(self, kind, id, fields):
+        with self._lock:
+            self.remove(kind, id)
+            self.docs[kind][id] = fields
+            for field, values in fields.items():
+                for value in values:
+                    for gram in _grams(value):
+                        self.postings[(kind, field, gram)].add(id)
+
+    def remove(self, kind, id):
+        with self._lock:
+            fields = self.docs[kind].pop(id, None)
+            if fields is None:
+                return
+            for field, values in fields.items():
+                for value in values:
+                    for gram in _grams(value):
+                        key = (kind, field, gram)
+                        ids = self.postings.get(key)
+                        if ids is not None:
+                            ids.discard(id)
+                            if not ids:
+                                del self.postings[key]
+
+    def lookup(self, kind, term, field='name'):
+        # Ids of `kind` whose `field` contains `term`, case-insensitively.
+        term = term.lower()
+        with self._lock:
+            if not term:
+                return set(self.docs[kind])
+            if len(term) <= GRAM_SIZE:
+                return set(self.postings.get((kind, field, term), ()))
+
+            grams = [term[i:i + GRAM_SIZE] for i in range(len(term) - GRAM_SIZE + 1)]
+            candidates = sorted((self.postings.get((kind, field, gram), set()) for gram in grams), key=len)
+            ids = set(candidates[0])
+            for postings in candidates[1:]:
+                ids &= postings
+                if not ids:
+                    return ids
+            docs = self.docs[kind]
+            return set(id for id in ids
+                       if any(term in value for value in docs[id][field]))
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _load(index, kind, where=None):
+    # Reads the rows of `kind` matching `where` (all of them by default)
+    # into the index.
+    model = MODELS[kind]
+    secondary = model.genres.property.secondary
+    owner = secondary.c[f'{kind}_id']
+    genres = defaultdict(list)
+    query = db.session.query(owner, Genre.name).join(Genre, secondary.c.genre_id == Genre.id)
+    if where is not None:
+        query = query.join(model, model.id == owner).filter(where)
+    for id, genre in query:
+        genres[id].append(genre)
+
+    query = db.session.query(model.id, model.name, model.city)
+    if where is not None:
+        query = query.filter(where)
+    for row in query.yield_per(1000):
+        fields = {
+            'name': _values('name', row.name),
+            'city': _values('city', row.city),
+            'genres': _values('genres', genres.get(row.id)),
+        }
+        index.add(kind, row.id, fields)
+
+
+def _signature():
+    # (row count, latest updated_at) per kind, in one round trip.
+    columns = []
+    for kind, model in MODELS.items():
+        columns.append(select(func.count(model.id)).scalar_subquery().label(f'{kind}_count'))
+        columns.append(select(func.max(model.updated_at)).scalar_subquery().label(f'{kind}_updated'))
+    row = db.session.execute(select(*columns)).one()._mapping
+    return dict((kind, (row[f'{kind}_count'], row[f'{kind}_updated'])) for kind in MODELS)
+
+
+def build():
+    index = InvertedIndex()
+    index.signature = _signature()
+    for kind in MODELS:
+        _load(index, kind)
+    return index
+
+
+def _catch_up(index, signature):
+    for kind, model in MODELS.items():
+        if signature[kind] == index.signature[kind]:
+            continue
+        count, updated = index.signature[kind]
+        _load(index, kind, None if updated is None else model.updated_at >= updated)
+        if len(index.docs[kind]) != signature[kind][0]:
+            existing = set(db.session.execute(select(model.id)).scalars())
+            for id in set(index.docs[kind]) - existing:
+                index.remove(kind, id)
+    index.signature = signature
+
+
+def _checked():
+    # Once per request; every call outside one.
+    if not has_request_context():
+        return False
+    checked = g.get('search_index_checked', False)
+    g.search_index_checked = True
+    return checked
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                _index = build()
+    elif not _checked():
+        sync()
+    _checked()
+    return _index
+
+
+def sync():
+    # Catches a loaded index up with the database now.
+    if _index is None:
+        return
+    signature = _signature()
+    with _build_lock:
+        if signature != _index.signature:
+            _catch_up(_index, signature)
+
+
+def reset():
+    global _index
+    _index = None
+
+
+def lookup(kind, term, field='name'):
+    return get_index().lookup(kind, term, field)
+
+
+#----------------------------------------------------------------------------#
+# Incremental updates.
+#----------------------------------------------------------------------------#
+
+PENDING_KEY = 'search_index_pending'
+
+
+def _stage(target):
+    session = object_session(target)
+    if session is None:
+        return
+    kind = 'venue' if isinstance(target, Venue) else 'artist'
+    session.info.setdefault(PENDING_KEY, set()).add((kind, target.id))
+
+
+def _after_write(mapper, connection, target):
+    _stage(target)
+
+
+for model in MODELS.values():
+    event.listen(model, 'after_insert', _after_write)
+    event.listen(model, 'after_update', _after_write)
+    event.listen(model, 'after_delete', _after_write)
+
+
+@jobs.task('search_index.refresh', local=True)
+def refresh(changed):
+    # Re-reads the given [kind, id] rows into the index; missing rows are
+    # removed.
+    if _index is None:
+        return
+    for kind, id in changed:
+        model = MODELS[kind]
+        row = db.session.query(model.id, model.name, model.city).filter(model.id == id).first()
+        if row is None:
+            _index.remove(kind, id)
+            continue
+        genres = db.session.query(Genre.name).select_from(model).join(model.genres).filter(
+            model.id == id).all()
+        _index.add(kind, id, {
+            'name': _values('name', row.name),
+            'city': _values('city', row.city),
+            'genres': _values('genres', [genre for genre, in genres]),
+        })
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    changed = session.info.pop(PENDING_KEY, None)
+    if changed and _index is not None:
+        jobs.enqueue('search_index.refresh', sorted(changed))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
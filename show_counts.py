@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+
+from models import db, add_counts, watermark, Artist, Venue, Show, ShowCountWatermark
+
+#----------------------------------------------------------------------------#
+# Show counter maintenance.
+#----------------------------------------------------------------------------#
+
+# Writes keep Venue/Artist.upcoming_shows_count and past_shows_count
+# current (see the Show counters section of models.py). This module moves
+# the watermark forward and checks the counters against the shows:
+#
+#   flask fyyur roll-over-counts      every few minutes, from cron
+#   flask fyyur check-counts [--repair]
+#
+# Both lock the watermark row, so they run one at a time and exclude
+# concurrent show writes for the length of their transaction.
+
+OWNERS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def roll_over(now=None):
+    # Moves the shows that started since the last rollover from upcoming to
+    # past and the watermark to `now`, in one transaction. Returns the
+    # number of shows moved.
+    now = now or datetime.now()
+    previous = watermark(db.session.connection(), for_update=True)
+    if now <= previous:
+        db.session.rollback()
+        return 0
+
+    started = and_(Show.start_time > previous, Show.start_time <= now)
+    for model, owner in OWNERS:
+        rows = db.session.execute(
+            select(owner, func.count(Show.id)).where(started).group_by(owner)).all()
+        add_counts(db.session.connection(), model, [(id, -count, count) for id, count in rows])
+    # Every show has one venue and one artist, so either pass sees all.
+    moved = sum(count for id, count in rows)
+    db.session.execute(ShowCountWatermark.__table__.update().values(rolled_over_at=now))
+    db.session.commit()
+    return moved
+
+
+def check(repair=False):
+    # Recomputes every counter from Show and returns the rows that drifted
+    # as (kind, id, (stored upcoming, past), (actual upcoming, past)). With
+    # repair=True the stored counters are set to the actual ones.
+    boundary = watermark(db.session.connection(), for_update=True)
+    drift = []
+    for model, owner in OWNERS:
+        upcoming = Show.start_time > boundary
+        actual = select(
+            owner.label('owner_id'),
+            func.count(Show.id).filter(upcoming).label('upcoming'),
+            func.count(Show.id).filter(~upcoming).label('past')
+        ).group_by(owner).subquery()
+        actual_upcoming = func.coalesce(actual.c.upcoming, 0)
+        actual_past = func.coalesce(actual.c.past, 0)
+        rows = db.session.execute(
+            select(model.id, model.upcoming_shows_count, model.past_shows_count,
+                   actual_upcoming, actual_past)
+            .outerjoin(actual, actual.c.owner_id == model.id)
+            .where(or_(model.upcoming_shows_count != actual_upcoming,
+                       model.past_shows_count != actual_past))
+            .order_by(model.id)).all()
+        kind = model.__tablename__.lower()
+        drift.extend((kind, id, (stored_upcoming, stored_past), (upcoming_count, past_count))
+                     for id, stored_upcoming, stored_past, upcoming_count, past_count in rows)
+        if repair:
+            add_counts(db.session.connection(), model, [
+                (id, upcoming_count - stored_upcoming, past_count - stored_past)
+                for id, stored_upcoming, stored_past, upcoming_count, past_count in rows])
+
+    if repair:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return drift
@@ -0,0 +1,65 @@
+import os
+import pytest
+
+from app import create_app
+from models import db
+from bench import datagen
+import search_index
+
+# Overrides applied on top of config.py (create_app loads it first).
+TEST_SETTINGS = {
+    'SECRET_KEY': 'test',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'DEBUG': False,
+    'TESTING': True,
+    'WTF_CSRF_ENABLED': False,
+    'LOG_FILE': os.devnull,
+    'PAGE_CACHE_BACKEND': None,
+    'SEARCH_BACKEND': 'database',
+    'IMAGE_THUMBNAILS': False,
+}
+
+def make_app(database_url, **overrides):
+    settings = dict(TEST_SETTINGS)
+    settings['SQLALCHEMY_DATABASE_URI'] = database_url
+    settings.update(overrides)
+    return create_app(type('TestConfig', (object,), settings))
+
+
+@pytest.fixture
+def app_factory():
+    return make_app
+
+
+@pytest.fixture
+def settings():
+    # Overridden by modules that need a different configuration.
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, settings):
+    app = make_app('sqlite:///' + str(tmp_path / 'fyyur.db'), **settings)
+    # The in-memory search index is per process; start from this database.
+    search_index.reset()
+    with app.app_context():
+        db.create_all()
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        # Shows spread around now: every page has past and upcoming ones.
+        datagen.generate(20, 30, 300, seed=1)
+        db.session.remove()
+    return app
+
+
+@pytest.fixture
+def client(seeded):
+    return seeded.test_client()
@@ -0,0 +1,47 @@
+from models import db, Artist
+
+
+def _venue_with_shows(client):
+    for venue_id in range(1, 21):
+        body = client.get(f'/api/v1/venues/{venue_id}').get_json()
+        shows = body['upcoming_shows'] + body['past_shows']
+        if shows:
+            return venue_id, shows[0]['artist_id']
+    raise AssertionError('no venue has shows')
+
+
+def test_unchanged_detail_is_not_modified(client):
+    response = client.get('/api/v1/venues/1')
+    again = client.get('/api/v1/venues/1', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_renaming_an_artist_changes_its_venues_etag(client, seeded):
+    venue_id, artist_id = _venue_with_shows(client)
+    etag = client.get(f'/api/v1/venues/{venue_id}').headers['ETag']
+
+    with seeded.app_context():
+        db.session.get(Artist, artist_id).name = 'Renamed'
+        db.session.commit()
+
+    response = client.get(f'/api/v1/venues/{venue_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    body = response.get_json()
+    assert 'Renamed' in [show['artist_name'] for show in body['upcoming_shows'] + body['past_shows']]
+    # Fields without shows do not depend on the artists.
+    response = client.get(f'/api/v1/venues/{venue_id}?fields=id,name')
+    assert client.get(f'/api/v1/venues/{venue_id}?fields=id,name',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_other_artist_columns_leave_its_venues_alone(client, seeded):
+    venue_id, artist_id = _venue_with_shows(client)
+    etag = client.get(f'/api/v1/venues/{venue_id}').headers['ETag']
+
+    with seeded.app_context():
+        db.session.get(Artist, artist_id).phone = 5559999
+        db.session.commit()
+
+    response = client.get(f'/api/v1/venues/{venue_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
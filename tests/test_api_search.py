@@ -0,0 +1,54 @@
+from sqlalchemy import event
+
+from models import db, Artist, Venue
+
+
+def _add(app, model, names):
+    with app.app_context():
+        for name in names:
+            fields = dict(name=name, city='San Francisco', state='CA', phone=5551234)
+            if model is Venue:
+                fields.update(address='1 Main St', seeking_talent=False)
+            else:
+                fields.update(seeking_venue=False)
+            db.session.add(model(**fields))
+        db.session.commit()
+
+
+def test_search_ranks_both_kinds_in_one_statement(app):
+    _add(app, Venue, ['The Jazz Cellar', 'Jazzland', 'Blue Note'])
+    _add(app, Artist, ['Acid Jazz Trio', 'Jazz Messengers'])
+    client = app.test_client()
+    # Warms the per-database FTS table lookup.
+    client.get('/api/v1/search?q=warm')
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/api/v1/search?q=jazz')
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(statements) == 1
+    # Prefix matches first, then the earliest match in the name.
+    assert [row['name'] for row in body['venue']['data']] == ['Jazzland', 'The Jazz Cellar']
+    assert [row['name'] for row in body['artist']['data']] == ['Jazz Messengers', 'Acid Jazz Trio']
+    assert body['venue']['count'] == 2 and body['artist']['count'] == 2
+
+
+def test_search_prefix_and_limit(app):
+    _add(app, Venue, ['Jazzland', 'The Jazz Cellar', 'Jazz Corner', 'Jazz Alley'])
+    client = app.test_client()
+    body = client.get('/api/v1/search?q=jaz&prefix=1&types=venue&per_page=2').get_json()
+    assert list(body) == ['venue']
+    assert body['venue']['count'] == 3
+    assert [row['name'] for row in body['venue']['data']] == ['Jazz Alley', 'Jazz Corner']
+
+
+def test_search_rejects_unknown_types(app):
+    response = app.test_client().get('/api/v1/search?q=x&types=venue,genre')
+    assert response.status_code == 400
@@ -0,0 +1,19 @@
+import pytest
+
+import areas
+from models import db
+from page_cache import cache
+
+
+@pytest.fixture
+def settings():
+    return {'PAGE_CACHE_BACKEND': 'memory'}
+
+
+def test_refresh_invalidates_the_venue_pages(client, seeded):
+    client.get('/venues')
+    generation = cache.backend.get('venues:generation')
+    with seeded.app_context():
+        areas.refresh()
+        db.session.remove()
+    assert cache.backend.get('venues:generation') != generation
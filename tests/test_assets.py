@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+import assets
+
+BUNDLES = {'js/all.js': ['js/a.js', 'js/libs/b.min.js']}
+
+
+def _tree(root, files):
+    for name, content in files.items():
+        path = os.path.join(root, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+def _read(root, name):
+    with open(os.path.join(root, *name.split('/')), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def built(tmp_path):
+    static, output = str(tmp_path / 'static'), str(tmp_path / 'assets')
+    _tree(static, {
+        'js/a.js': b'var a = 1;\n',
+        'js/libs/b.min.js': b'var b=2;\n//# sourceMappingURL=b.min.map\n',
+        'js/libs/b.min.map': b'{"version":3,"file":"b.min.js","mappings":""}',
+        'js/libs/c.min.js': b'var c=3;\n//# sourceMappingURL=c.min.map\n',
+        'js/libs/c.min.map': b'{"version":3,"file":"c.min.js","mappings":""}',
+        'js/libs/d.min.js': b'var d=4;\n//# sourceMappingURL=missing.map\n',
+        'css/site.css': b'body { background: url("../img/bg.png"); }\n',
+        'img/bg.png': b'png',
+    })
+    return output, assets.build(static, output, BUNDLES)
+
+
+def test_build_writes_hashed_files_and_manifest(built):
+    output, manifest = built
+    with open(os.path.join(output, 'manifest.json')) as f:
+        assert json.load(f) == manifest
+    assert set(manifest) == {'js/all.js', 'js/a.js', 'js/libs/b.min.js', 'js/libs/b.min.map',
+                             'js/libs/c.min.js', 'js/libs/c.min.map', 'js/libs/d.min.js',
+                             'css/site.css', 'img/bg.png'}
+    for name, hashed in manifest.items():
+        assert hashed != name and os.path.isfile(os.path.join(output, *hashed.split('/')))
+    css = _read(output, manifest['css/site.css'])
+    assert b'../' + manifest['img/bg.png'].encode() in css
+
+
+def test_source_map_comments_name_the_hashed_maps(built):
+    output, manifest = built
+    hashed_map = manifest['js/libs/c.min.map'].split('/')[-1]
+    assert _read(output, manifest['js/libs/c.min.js']).endswith(
+        f'//# sourceMappingURL={hashed_map}\n'.encode())
+    # Unknown maps are left alone, and bundle parts lose theirs.
+    assert b'sourceMappingURL=missing.map' in _read(output, manifest['js/libs/d.min.js'])
+    assert b'sourceMappingURL' not in _read(output, manifest['js/all.js'])
+
+
+def test_built_assets_are_served_immutable(app_factory, built):
+    output, manifest = built
+    app = app_factory('sqlite://', ASSETS_DIR=output,
+                      ASSETS_MANIFEST=os.path.join(output, 'manifest.json'))
+    with app.test_request_context():
+        url = assets.asset_url('js/libs/c.min.js')
+    assert url == '/assets/' + manifest['js/libs/c.min.js']
+
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'identity'})
+    assert response.status_code == 200
+    assert response.cache_control.immutable and response.cache_control.public
+    assert 'Accept-Encoding' in response.vary
+    assert app.test_client().get('/assets/manifest.json').status_code == 404
+
+
+def test_no_manifest_setting_links_static_files(app_factory):
+    app = app_factory('sqlite://', ASSETS_MANIFEST=None)
+    assert app.extensions['assets'] is None
+    with app.test_request_context():
+        assert assets.asset_urls('js/fyyur.js') == [
+            '/static/' + part for part in assets.BUNDLES['js/fyyur.js']]
@@ -0,0 +1,24 @@
+import config
+import db_pool
+
+DEFAULTS = dict((key, getattr(config, key)) for key in dir(config) if key.isupper())
+
+
+def test_engine_options_use_configured_settings():
+    options = db_pool.engine_options(dict(
+        DEFAULTS, SQLALCHEMY_DATABASE_URI='postgresql://db/fyyur',
+        DATABASE_POOL_SIZE=2, DATABASE_STATEMENT_TIMEOUT_MS=100))
+    assert options['poolclass'] is db_pool.InstrumentedQueuePool
+    assert options['pool_size'] == 2
+    assert options['max_overflow'] == config.DATABASE_MAX_OVERFLOW
+    assert options['connect_args'] == {'options': '-c statement_timeout=100'}
+
+
+def test_engine_options_without_statement_timeout():
+    options = db_pool.engine_options(dict(
+        DEFAULTS, SQLALCHEMY_DATABASE_URI='postgresql://db/fyyur', DATABASE_STATEMENT_TIMEOUT_MS=None))
+    assert 'connect_args' not in options
+
+
+def test_engine_options_leave_sqlite_alone():
+    assert db_pool.engine_options(dict(DEFAULTS, SQLALCHEMY_DATABASE_URI='sqlite://')) == {}
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import ipaddress
+import os
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image
+
+import images
+from models import db, Venue
+
+WIDTHS = (40, 80)
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+PNG = _png(120, 60)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # path -> (status, headers, body)
+    routes = {}
+
+    def do_GET(self):
+        status, headers, body = self.routes.get(self.path, (404, {}, b'missing'))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{httpd.server_address[1]}'
+    Handler.routes = {
+        '/image.png': (200, {'Content-Type': 'image/png'}, PNG),
+        '/big.png': (200, {'Content-Type': 'image/png'}, b'x' * 2048),
+        '/page.html': (200, {'Content-Type': 'text/html'}, b'<html></html>'),
+        '/broken.png': (503, {}, b'try later'),
+        '/redirect': (302, {'Location': base + '/image.png'}, b''),
+        '/to-metadata': (302, {'Location': 'http://169.254.169.254/latest/meta-data/'}, b''),
+        '/to-other-loopback': (302, {'Location': base.replace('127.0.0.1', '127.0.0.2') + '/image.png'}, b''),
+    }
+    yield base
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return {
+        'IMAGE_DIR': str(tmp_path / 'images'),
+        'IMAGE_THUMBNAIL_WIDTHS': WIDTHS,
+        'IMAGE_MAX_BYTES': 1024,
+        'IMAGE_ALLOW_PRIVATE_HOSTS': True,
+    }
+
+
+def _venue(link):
+    venue = Venue(name='The Hop', city='San Francisco', state='CA', address='1 Main St',
+                  phone=5551234, image_link=link)
+    db.session.add(venue)
+    db.session.commit()
+    return venue.id
+
+
+def test_ingest_stores_thumbnails_by_digest(app, server):
+    url = server + '/image.png'
+    with app.app_context():
+        venue_id = _venue(url)
+        images.ingest(url)
+        digest = db.session.get(Venue, venue_id).image_digest
+
+    assert digest == hashlib.sha256(PNG).hexdigest()
+    for width in WIDTHS:
+        path = os.path.join(app.config['IMAGE_DIR'], digest[:2], f'{digest}-{width}.webp')
+        with Image.open(path) as thumbnail:
+            assert thumbnail.format == 'WEBP'
+            # Scaled down to the width, never up.
+            assert thumbnail.size[0] == min(width, 120)
+
+
+def test_ingest_follows_redirects(app, server):
+    url = server + '/redirect'
+    with app.app_context():
+        venue_id = _venue(url)
+        images.ingest(url)
+        assert db.session.get(Venue, venue_id).image_digest == hashlib.sha256(PNG).hexdigest()
+
+
+@pytest.mark.parametrize('path', ['/big.png', '/page.html', '/missing.png'])
+def test_rejected_images_keep_the_link(app, server, path):
+    url = server + path
+    with app.app_context():
+        venue_id = _venue(url)
+        images.ingest(url)
+        assert db.session.get(Venue, venue_id).image_digest is None
+    assert not os.path.exists(app.config['IMAGE_DIR']) or not os.listdir(app.config['IMAGE_DIR'])
+
+
+def test_server_errors_are_retried(app, server):
+    url = server + '/broken.png'
+    with app.app_context():
+        _venue(url)
+        with pytest.raises(urllib.error.HTTPError):
+            images.ingest(url)
+
+
+def test_thumbnails_are_served_immutable(app, server):
+    url = server + '/image.png'
+    with app.app_context():
+        _venue(url)
+        images.ingest(url)
+    digest = hashlib.sha256(PNG).hexdigest()
+
+    client = app.test_client()
+    response = client.get(f'/images/{digest}-{WIDTHS[0]}.webp')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert response.cache_control.immutable and response.cache_control.public
+    assert response.cache_control.max_age == images.IMMUTABLE_MAX_AGE
+    # Only the configured widths of well-formed digests.
+    assert client.get(f'/images/{digest}-50.webp').status_code == 404
+    assert client.get(f'/images/{"z" * 64}-{WIDTHS[0]}.webp').status_code == 404
+
+
+FETCH = {'IMAGE_FETCH_TIMEOUT': 5, 'IMAGE_MAX_BYTES': 1024, 'IMAGE_ALLOW_PRIVATE_HOSTS': False}
+
+
+@pytest.mark.parametrize('url', [
+    'http://169.254.169.254/latest/meta-data/',
+    'http://10.0.0.1/image.png',
+    'http://[::1]/image.png',
+    'http://localhost/image.png',
+])
+def test_fetch_refuses_non_public_hosts(url):
+    with pytest.raises(images.BlockedAddress):
+        images.fetch(url, FETCH)
+
+
+def test_fetch_refuses_redirects_to_non_public_hosts(server, monkeypatch):
+    # The stand-in server plays a public host; everything else stays
+    # private.
+    monkeypatch.setattr(images, 'public_address',
+                        lambda address: address == ipaddress.ip_address('127.0.0.1'))
+    assert images.fetch(server + '/image.png', FETCH) == PNG
+    for path in ('/to-metadata', '/to-other-loopback'):
+        with pytest.raises(images.BlockedAddress):
+            images.fetch(server + path, FETCH)
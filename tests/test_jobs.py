@@ -0,0 +1,36 @@
+import threading
+import time
+
+from flask import Flask
+
+import jobs
+
+
+def test_failing_jobs_are_retried_then_dead_lettered():
+    app = Flask(__name__)
+    app.config.from_object('config')
+    app.config.update(JOB_MAX_ATTEMPTS=2, JOB_RETRY_DELAY=0.01)
+    jobs.init_app(app)
+
+    attempts = []
+    done = threading.Event()
+
+    def fail():
+        attempts.append(1)
+        if len(attempts) == 2:
+            done.set()
+        raise RuntimeError('boom')
+
+    jobs.task('test.fail')(fail)
+    try:
+        with app.app_context():
+            jobs.enqueue('test.fail')
+        assert done.wait(5)
+        deadline = time.monotonic() + 5
+        while not any(letter['name'] == 'test.fail' for letter in jobs.DEAD_LETTERS) and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        del jobs.TASKS['test.fail']
+    assert len(attempts) == 2
+    assert any(letter['name'] == 'test.fail' for letter in jobs.DEAD_LETTERS)
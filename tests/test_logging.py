@@ -0,0 +1,14 @@
+import profiling
+
+
+def test_create_app_installs_one_json_handler(app_factory, tmp_path):
+    for _ in range(3):
+        app = app_factory('sqlite://', LOG_FILE=str(tmp_path / 'app.log'))
+    json_handlers = [handler for handler in app.logger.handlers
+                     if isinstance(handler.formatter, profiling.JsonFormatter)]
+    assert len(json_handlers) == 1
+
+    app.logger.info('once')
+    for handler in app.logger.handlers:
+        handler.flush()
+    assert (tmp_path / 'app.log').read_text().count('"once"') == 1
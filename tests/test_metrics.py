@@ -0,0 +1,35 @@
+import threading
+
+import metrics
+
+
+def _record(registry, times):
+    for i in range(times):
+        registry.inc('fyyur_requests_total', (('endpoint', 'index'), ('status', '200')))
+        registry.observe('fyyur_response_bytes', (('endpoint', 'index'),), 300)
+
+
+def test_exited_threads_are_folded_into_the_totals():
+    registry = metrics.Registry()
+    for i in range(50):
+        thread = threading.Thread(target=_record, args=(registry, 2))
+        thread.start()
+        thread.join()
+    _record(registry, 1)
+
+    totals = registry.snapshot()
+    assert totals[('fyyur_requests_total', (('endpoint', 'index'), ('status', '200')))] == [101]
+    histogram = totals[('fyyur_response_bytes', (('endpoint', 'index'),))]
+    assert histogram[-1] == 101 and histogram[-2] == 300 * 101
+    # Only the calling thread still has a shard.
+    assert len(registry._shards) == 1
+
+
+def test_clear_drops_retired_totals():
+    registry = metrics.Registry()
+    thread = threading.Thread(target=_record, args=(registry, 1))
+    thread.start()
+    thread.join()
+    registry.snapshot()
+    registry.clear()
+    assert all(not any(values) for values in registry.snapshot().values())
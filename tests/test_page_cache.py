@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import jobs
+from models import db, Artist, Venue, Show
+from page_cache import cache, LRUBackend, RedisBackend
+
+
+class FakeRedis(object):
+    # The part of the redis-py client RedisBackend uses, over a dict.
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[key]
+            return None
+        return None if value is None else value.encode('utf-8')
+
+    def set(self, key, value, px=None):
+        self.data[key] = (value, time.time() + px / 1000 if px else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip('*'))]
+
+
+@pytest.fixture
+def settings():
+    return {'PAGE_CACHE_BACKEND': 'memory'}
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request, seeded, monkeypatch):
+    if request.param == 'redis':
+        monkeypatch.setattr(cache, 'backend', RedisBackend(FakeRedis()))
+        # Shared invalidations run as jobs; run them inline.
+        monkeypatch.setattr(jobs, 'enqueue', lambda name, *args, **kw: jobs.run(name, list(args)))
+    monkeypatch.setattr(cache, 'hits', 0)
+    monkeypatch.setattr(cache, 'misses', 0)
+    return request.param
+
+
+def _hit(client, path):
+    hits = cache.hits
+    response = client.get(path)
+    assert response.status_code == 200
+    return cache.hits > hits
+
+
+def _venue_with_shows(app):
+    with app.app_context():
+        return db.session.execute(select(Show.venue_id, Show.artist_id).limit(1)).one()
+
+
+def test_pages_are_served_from_the_cache(client, backend):
+    first = client.get('/venues/1').data
+    assert _hit(client, '/venues/1')
+    assert client.get('/venues/1').data == first
+    assert not _hit(client, '/artists/1')
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'hit_ratio': 0.5}
+
+
+def test_venue_write_invalidates_its_page_and_the_directory(client, seeded, backend):
+    client.get('/venues/1')
+    client.get('/venues')
+    assert _hit(client, '/venues/1') and _hit(client, '/venues')
+    with seeded.app_context():
+        db.session.get(Venue, 1).phone = 5550000
+        db.session.commit()
+    assert not _hit(client, '/venues/1')
+    assert not _hit(client, '/venues')
+
+
+def test_artist_rename_invalidates_the_venues_it_plays(client, seeded, backend):
+    venue_id, artist_id = _venue_with_shows(seeded)
+    for path in (f'/venues/{venue_id}', f'/artists/{artist_id}'):
+        client.get(path)
+        assert _hit(client, path)
+    with seeded.app_context():
+        db.session.get(Artist, artist_id).name = 'Renamed'
+        db.session.commit()
+    assert not _hit(client, f'/artists/{artist_id}')
+    assert not _hit(client, f'/venues/{venue_id}')
+
+
+def test_show_write_invalidates_both_owners(client, seeded, backend):
+    venue_id, artist_id = _venue_with_shows(seeded)
+    paths = (f'/venues/{venue_id}', f'/artists/{artist_id}', '/venues')
+    for path in paths:
+        client.get(path)
+    with seeded.app_context():
+        db.session.add(Show(venue_id=venue_id, artist_id=artist_id,
+                            start_time=datetime.now() + timedelta(days=400)))
+        db.session.commit()
+    for path in paths:
+        assert not _hit(client, path)
+
+
+def test_rolled_back_writes_keep_the_cache(client, seeded, backend):
+    client.get('/venues/1')
+    with seeded.app_context():
+        db.session.get(Venue, 1).phone = 5550000
+        db.session.flush()
+        db.session.rollback()
+    assert _hit(client, '/venues/1')
+
+
+@pytest.mark.parametrize('make_backend', [lambda: LRUBackend(), lambda: RedisBackend(FakeRedis())])
+def test_entries_expire_at_the_reported_time(seeded, make_backend, monkeypatch):
+    monkeypatch.setattr(cache, 'backend', make_backend())
+    rendered = []
+
+    def render(expires_in):
+        def view():
+            rendered.append(1)
+            cache.expire_at(datetime.now() + timedelta(seconds=expires_in))
+            return 'page'
+        return view
+
+    with seeded.test_request_context():
+        cache.get_or_render('soon', render(0.2))
+        cache.get_or_render('soon', render(0.2))
+        assert len(rendered) == 1
+        time.sleep(0.3)
+        cache.get_or_render('soon', render(0.2))
+        assert len(rendered) == 2
+        # Already over: not stored at all.
+        cache.get_or_render('past', render(-1))
+        cache.get_or_render('past', render(-1))
+        assert len(rendered) == 4
+
+
+def test_redis_backend_prefixes_and_decodes():
+    client = FakeRedis()
+    backend = RedisBackend(client, prefix='p:')
+    backend.set('a', 'é', ttl=60)
+    backend.set('b', 'x')
+    assert set(client.data) == {'p:a', 'p:b'}
+    assert backend.get('a') == 'é'
+    backend.delete('a')
+    assert backend.get('a') is None
+    backend.clear()
+    assert client.data == {}
@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+
+def _cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    values = ['The Hop', 3, 1.5, datetime(2031, 1, 1, 20, 0)]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize('payload', [
+    {'a': 1}, [[1], [2]], [{'x': 1}], [{'dt': 'soon'}], [{'dt': 5}], [True], [None],
+])
+def test_decode_rejects_foreign_values(payload):
+    with pytest.raises(ValueError):
+        decode_cursor(_cursor(payload))
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows', '/api/v1/venues',
+                                  '/api/v1/artists', '/api/v1/shows'])
+@pytest.mark.parametrize('payload', [
+    [[1], [2], [3], [4]],
+    [{'x': 1}, {'x': 2}, {'x': 3}, {'x': 4}],
+    ['a', 'b', 'c', 'd', 'e'],
+    [1, 'two'],
+    ['name', 'not an id'],
+])
+def test_malformed_cursors_are_client_errors(client, path, payload):
+    response = client.get(path, query_string={'after': _cursor(payload)})
+    assert response.status_code == 400
+    response = client.get(path, query_string={'before': 'not base64!'})
+    assert response.status_code == 400
+
+
+def test_cursors_from_a_listing_still_work(client):
+    body = client.get('/api/v1/artists', query_string={'per_page': 5}).get_json()
+    following = client.get('/api/v1/artists', query_string={'per_page': 5, 'after': body['next']})
+    assert following.status_code == 200
+    assert following.get_json()['data'][0]['id'] not in [row['id'] for row in body['data']]
@@ -0,0 +1,26 @@
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db
+import profiling
+
+
+def test_failed_statement_does_not_skew_the_next(app):
+    with app.test_request_context():
+        profiling._start()
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        # A start time left over from the failed statement would show up
+        # as this pause in the next statement's duration.
+        time.sleep(0.05)
+        started = time.perf_counter()
+        db.session.execute(text('SELECT 1'))
+        elapsed = time.perf_counter() - started
+        profile = profiling.current_profile()
+        assert profile.statements == 1
+        assert 0 < profile.db_time <= elapsed
+        db.session.remove()
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements each route runs against a seeded database, with the page
+# cache off. A change here is a change in the route's loading: update the
+# number only when that is intended.
+ROUTES = [
+    ('GET', '/', None, 0),
+    ('GET', '/venues', None, 1),
+    ('GET', '/venues/1', None, 5),
+    ('GET', '/artists', None, 1),
+    ('GET', '/artists/1', None, 5),
+    ('GET', '/shows', None, 1),
+    ('POST', '/venues/search', {'search_term': 'hop'}, 3),
+    ('POST', '/venues/search', {'search_term': 'zzz'}, 2),
+    ('POST', '/artists/search', {'search_term': 'band'}, 3),
+    ('GET', '/venues/1/edit', None, 2),
+    ('GET', '/artists/1/edit', None, 2),
+    ('GET', '/api/v1/venues', None, 1),
+    ('GET', '/api/v1/venues/1', None, 6),
+    ('GET', '/api/v1/venues/1?fields=id,name', None, 2),
+    ('GET', '/api/v1/artists', None, 1),
+    ('GET', '/api/v1/artists/1', None, 6),
+    ('GET', '/api/v1/shows', None, 1),
+]
+
+
+@pytest.fixture
+def statements():
+    seen = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    yield seen
+    event.remove(Engine, 'before_cursor_execute', count)
+
+
+@pytest.mark.parametrize('method, path, data, expected', ROUTES,
+                         ids=[f'{method} {path}' for method, path, data, expected in ROUTES])
+def test_statements_per_route(client, statements, method, path, data, expected):
+    response = client.open(path, method=method, data=data)
+    assert response.status_code == 200
+    assert len(statements) == expected, '\n'.join(statements)
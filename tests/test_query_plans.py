@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from models import db
+from bench import explain_plans
+from bench.common import make_app
+
+# EXPLAIN checks of bench/explain_plans.py. SQLite always runs; Postgres
+# runs against the already seeded database named by FYYUR_TEST_POSTGRES_URL
+# (e.g. filled by `python -m bench.datagen`) and is skipped without it.
+POSTGRES_URL = os.environ.get('FYYUR_TEST_POSTGRES_URL')
+
+
+@pytest.fixture(scope='module', params=['sqlite', 'postgresql'])
+def plan_app(request):
+    if request.param == 'sqlite':
+        app = make_app('sqlite://')
+        with app.app_context():
+            db.create_all()
+            explain_plans.seed()
+            db.session.remove()
+    elif POSTGRES_URL:
+        app = make_app(POSTGRES_URL)
+    else:
+        pytest.skip('FYYUR_TEST_POSTGRES_URL is not set')
+    return app
+
+
+@pytest.mark.parametrize('label, query, index', explain_plans.CHECKS,
+                         ids=[label for label, query, index in explain_plans.CHECKS])
+def test_query_uses_index(plan_app, label, query, index):
+    with plan_app.app_context():
+        try:
+            plans = [explain_plans.explain(statement, parameters)
+                     for statement, parameters in explain_plans.capture(query)]
+        finally:
+            db.session.rollback()
+    assert any(index in plan for plan in plans), '\n\n'.join(plans)
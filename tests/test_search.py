@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from models import db, Venue
+import search
+import search_index
+
+
+@pytest.fixture
+def settings():
+    return {'SEARCH_BACKEND': 'memory'}
+
+
+def _ids(term):
+    return sorted(db.session.execute(select(Venue.id).where(search.matches(Venue, term))).scalars())
+
+
+def _bound(term):
+    return search.matches(Venue, term).compile().params
+
+
+def test_memory_matches_bind_a_bounded_id_list(seeded, monkeypatch):
+    with seeded.test_request_context():
+        database = dict((term, _ids(term)) for term in ('', 'a', 'mu', 'music', 'the'))
+        # Short terms never bind posting lists.
+        assert _bound('') == {'name_1': '%%'}
+        assert 'id_1' not in _bound('a')
+        assert 'id_1' not in _bound('mu')
+
+        monkeypatch.setattr(search, 'MAX_BOUND_IDS', 3)
+        for term, ids in database.items():
+            assert _ids(term) == ids
+            assert len(_bound(term)) <= 3
+
+
+def test_memory_matches_agree_with_database(seeded):
+    with seeded.test_request_context():
+        memory = _ids('music')
+        seeded.config['SEARCH_BACKEND'] = 'database'
+        assert _ids('music') == memory
+
+
+def test_memory_index_catches_up_with_writes_it_missed(seeded):
+    # Writes outside the ORM, as another worker or the importer makes them.
+    with seeded.test_request_context():
+        assert search_index.lookup('venue', 'zebra') == set()
+    with seeded.app_context():
+        table = Venue.__table__
+        db.session.execute(table.insert().values(
+            name='Zebra Lounge', city='Oakland', state='CA', address='2 Side St', phone=5550000,
+            seeking_talent=False, created_at=datetime.utcnow(), updated_at=datetime.utcnow()))
+        db.session.execute(table.delete().where(table.c.id == 1))
+        db.session.commit()
+        added = db.session.execute(select(table.c.id).where(table.c.name == 'Zebra Lounge')).scalar()
+
+    with seeded.test_request_context():
+        assert search_index.lookup('venue', 'zebra') == {added}
+        assert 1 not in search_index.lookup('venue', '')
+        assert search.counts('zebra', ['venue']) == {'venue': 1}
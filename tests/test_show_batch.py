@@ -0,0 +1,68 @@
+import pytest
+
+from models import db, Show
+
+SHOWS = [
+    {'venue_id': 1, 'artist_id': 1, 'start_time': '2031-01-01T20:00:00'},
+    {'venue_id': 2, 'artist_id': 2, 'start_time': '2031-01-02 20:00:00'},
+]
+
+
+def _count(app):
+    with app.app_context():
+        return Show.query.count()
+
+
+@pytest.mark.parametrize('payload', [[], {'shows': []}])
+def test_empty_batch_is_rejected(client, payload):
+    response = client.post('/shows/batch', json=payload)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_batch_creates_shows_and_returns_their_ids(client, seeded):
+    before = _count(seeded)
+    response = client.post('/shows/batch', json={'shows': SHOWS})
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    assert body['created'] == 2
+    assert [result['status'] for result in body['results']] == ['created', 'created']
+    assert _count(seeded) == before + 2
+    with seeded.app_context():
+        for result, item in zip(body['results'], SHOWS):
+            show = db.session.get(Show, result['id'])
+            assert (show.venue_id, show.artist_id) == (item['venue_id'], item['artist_id'])
+
+
+def test_unknown_ids_reject_the_whole_batch(client, seeded):
+    before = _count(seeded)
+    response = client.post('/shows/batch', json=SHOWS + [
+        {'venue_id': 9999, 'artist_id': 1, 'start_time': '2031-01-03T20:00:00'},
+        {'venue_id': 1, 'artist_id': 9999, 'start_time': '2031-01-03T20:00:00'},
+    ])
+    assert response.status_code == 422
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['not_created', 'not_created', 'rejected', 'rejected']
+    assert 'venue_id' in results[2]['errors'] and 'artist_id' in results[3]['errors']
+    assert _count(seeded) == before
+
+
+def test_partial_batch_creates_the_valid_shows(client, seeded):
+    before = _count(seeded)
+    response = client.post('/shows/batch', json={'partial': True, 'shows': SHOWS + [
+        {'venue_id': 9999, 'artist_id': 1, 'start_time': '2031-01-03T20:00:00'},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['created'] == 2
+    assert [result['status'] for result in body['results']] == ['created', 'created', 'rejected']
+    assert 'id' not in body['results'][2]
+    assert _count(seeded) == before + 2
+
+
+@pytest.mark.parametrize('start_time', ['2031-01-01T20:00:00+02:00', '2031-01-01T20:00:00Z', 'soon'])
+def test_start_times_must_be_local(client, seeded, start_time):
+    response = client.post('/shows/batch', json=[
+        {'venue_id': 1, 'artist_id': 1, 'start_time': start_time}])
+    assert response.status_code == 422
+    assert 'start_time' in response.get_json()['results'][0]['errors']
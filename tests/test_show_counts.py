@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+from models import db, watermark, Artist, Venue, Show
+import show_counts
+
+
+def _counts(model, id):
+    row = db.session.get(model, id, populate_existing=True)
+    return row.upcoming_shows_count, row.past_shows_count
+
+
+def _add(counts, delta):
+    return tuple(count + change for count, change in zip(counts, delta))
+
+
+def test_show_writes_keep_the_counters(seeded):
+    later = datetime.now() + timedelta(days=400)
+    earlier = datetime.now() - timedelta(days=400)
+    with seeded.app_context():
+        venue_1, venue_2, artist = _counts(Venue, 1), _counts(Venue, 2), _counts(Artist, 1)
+
+        show = Show(venue_id=1, artist_id=1, start_time=later)
+        db.session.add(show)
+        db.session.commit()
+        assert _counts(Venue, 1) == _add(venue_1, (1, 0))
+        assert _counts(Artist, 1) == _add(artist, (1, 0))
+
+        show.venue_id, show.start_time = 2, earlier
+        db.session.commit()
+        assert _counts(Venue, 1) == venue_1
+        assert _counts(Venue, 2) == _add(venue_2, (0, 1))
+        assert _counts(Artist, 1) == _add(artist, (0, 1))
+
+        db.session.delete(show)
+        db.session.commit()
+        assert (_counts(Venue, 1), _counts(Venue, 2), _counts(Artist, 1)) == (venue_1, venue_2, artist)
+        assert show_counts.check() == []
+
+
+def test_deleting_a_venue_uncounts_its_shows(seeded):
+    with seeded.app_context():
+        total = db.func.sum(Artist.upcoming_shows_count + Artist.past_shows_count)
+        before = db.session.query(total).scalar()
+        venue = db.session.get(Venue, 1)
+        shows = len(venue.shows)
+        assert shows
+        db.session.delete(venue)
+        db.session.commit()
+        assert Show.query.filter_by(venue_id=1).count() == 0
+        assert db.session.query(total).scalar() == before - shows
+        assert show_counts.check() == []
+
+
+def test_roll_over_moves_the_started_shows_to_past(seeded):
+    with seeded.app_context():
+        previous = watermark(db.session.connection())
+        db.session.rollback()
+        now = previous + timedelta(days=30)
+        started = Show.query.filter(Show.start_time > previous, Show.start_time <= now)
+        expected = started.count()
+        venue_id = started.first().venue_id
+        upcoming, past = _counts(Venue, venue_id)
+        moved_here = started.filter(Show.venue_id == venue_id).count()
+        db.session.rollback()
+
+        assert show_counts.roll_over(now) == expected
+        assert watermark(db.session.connection()) == now
+        assert _counts(Venue, venue_id) == (upcoming - moved_here, past + moved_here)
+        assert show_counts.check() == []
+        # The watermark only moves forward.
+        assert show_counts.roll_over(previous) == 0
+
+
+def test_check_reports_and_repairs_drift(seeded):
+    with seeded.app_context():
+        actual = _counts(Venue, 3)
+        db.session.execute(Venue.__table__.update().where(Venue.id == 3).values(
+            upcoming_shows_count=Venue.upcoming_shows_count + 5))
+        db.session.commit()
+
+        drift = [('venue', 3, _add(actual, (5, 0)), actual)]
+        # Without repair nothing changes.
+        assert show_counts.check() == drift
+        assert show_counts.check() == drift
+        assert show_counts.check(repair=True) == drift
+        assert show_counts.check() == []
+        assert _counts(Venue, 3) == actual
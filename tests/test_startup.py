@@ -0,0 +1,25 @@
+import config
+from app import create_app
+from models import db
+
+
+def test_create_app_with_a_bare_config(tmp_path):
+    # The few settings bench/bench_startup.py's probe passes; create_app
+    # takes everything else from config.py.
+    class Config(object):
+        SECRET_KEY = 'bare'
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'fyyur.db')
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        PAGE_CACHE_BACKEND = None
+
+    app = create_app(Config)
+    assert app.config['SECRET_KEY'] == 'bare'
+    assert app.config['JOB_MAX_ATTEMPTS'] == config.JOB_MAX_ATTEMPTS
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+    assert client.get('/venues').status_code == 200
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()